@@ -3,5 +3,30 @@
 
 from __future__ import absolute_import, division, print_function
 from .version import version as __version__  # noqa: F401
+from .lazy_import import lazy_attributes
 
 __copyright__ = '(c) Copyright 2020 Sensirion AG, Switzerland'
+
+# Subsystems are only imported on first access to keep the import time low.
+# On Python < 3.7, only the lightweight ones are imported immediately, the
+# others (profiling, sample server and shared memory ring) have to be
+# imported from their modules there.
+__getattr__, __dir__ = lazy_attributes(__name__, {
+    'sfm3019': ('.sfm3019', None),
+    'error_recovery': ('.error_recovery', None),
+    'profiling': ('.profiling', None),
+    'sample_server': ('.sample_server', None),
+    'shared_memory_ring': ('.shared_memory_ring', None),
+    'simulation': ('.simulation', None),
+    'timing': ('.timing', None),
+    'AcquisitionProfiler': ('.profiling', 'AcquisitionProfiler'),
+    'CrcCalculator': ('.crc_calculator', 'CrcCalculator'),
+    'I2cChecksumError': ('.sensirion_word_command', 'I2cChecksumError'),
+    'RecoveryPolicy': ('.error_recovery', 'RecoveryPolicy'),
+    'SampleClient': ('.sample_server', 'SampleClient'),
+    'SampleServer': ('.sample_server', 'SampleServer'),
+    'SampleRingPublisher': ('.shared_memory_ring', 'SampleRingPublisher'),
+    'SampleRingSubscriber': ('.shared_memory_ring', 'SampleRingSubscriber'),
+    'SimulatedSensorBridge': ('.simulation', 'SimulatedSensorBridge'),
+}, eager=['sfm3019', 'error_recovery', 'simulation', 'timing', 'CrcCalculator',
+          'I2cChecksumError', 'RecoveryPolicy', 'SimulatedSensorBridge'])
@@ -0,0 +1,312 @@
+# -*- coding: utf-8 -*-
+# (c) Copyright 2020 Sensirion AG, Switzerland
+
+"""
+High-rate acquisition of SFM measurements into a file, with live statistics.
+
+Captures are written either as NumPy ``.npy`` file (structured array with the
+fields of :py:data:`CAPTURE_DTYPE`) or as compact binary file with one
+:py:data:`CAPTURE_RECORD` (channel, timestamp, flow, temperature, little
+endian) per sample. Use :py:func:`read_capture_file` to load binary files.
+"""
+
+from __future__ import absolute_import, division, print_function
+from struct import Struct
+import argparse
+import os
+import sys
+import time
+
+from .command_line import add_sensor_bridge_arguments, create_devices, \
+    open_sensor_bridge
+from .profiling import profile_from_environment
+from .timing import _import_numpy
+
+#: Record of one sample in a binary capture file.
+CAPTURE_RECORD = Struct("<Hddd")
+
+#: NumPy dtype of a capture, equal to the layout of :py:data:`CAPTURE_RECORD`.
+CAPTURE_DTYPE = [('channel', '<u2'), ('timestamp', '<f8'), ('flow', '<f8'),
+                 ('temperature', '<f8')]
+
+
+def read_capture_file(path):
+    """
+    Reads a capture file written by the ``sfm-capture`` console script.
+
+    :param str path:
+        Path to the ``.npy`` or binary capture file.
+    :return:
+        For ``.npy`` files, a NumPy structured array. Otherwise a list of
+        tuples (channel, timestamp, flow, temperature).
+    :rtype:
+        numpy.ndarray/list
+    """
+    if path.endswith(".npy"):
+        return _import_numpy(".npy files").load(path)
+    with open(path, "rb") as f:
+        data = f.read()
+    return [CAPTURE_RECORD.unpack_from(data, offset) for offset in
+            range(0, len(data) - CAPTURE_RECORD.size + 1, CAPTURE_RECORD.size)]
+
+
+class _BinaryWriter(object):
+    def __init__(self, path):
+        self._file = open(path, "wb")
+
+    def write(self, records):
+        self._file.write(b"".join(CAPTURE_RECORD.pack(*r) for r in records))
+
+    def close(self):
+        self._file.close()
+
+
+class _NumpyWriter(_BinaryWriter):
+    """
+    Streams binary records into a temporary file and converts it into the
+    ``.npy`` file chunk by chunk when closed, so the memory usage does not
+    grow with the capture duration.
+    """
+
+    #: Number of records converted at once.
+    CHUNK_SIZE = 1 << 16
+
+    def __init__(self, path):
+        self._numpy = _import_numpy(".npy files")
+        self._path = path
+        self._raw_path = path + ".part"
+        super(_NumpyWriter, self).__init__(self._raw_path)
+
+    def close(self):
+        super(_NumpyWriter, self).close()
+        numpy = self._numpy
+        dtype = numpy.dtype(CAPTURE_DTYPE)
+        count = os.path.getsize(self._raw_path) // dtype.itemsize
+        array = numpy.lib.format.open_memmap(self._path, mode="w+",
+                                             dtype=dtype, shape=(count,))
+        with open(self._raw_path, "rb") as f:
+            for start in range(0, count, self.CHUNK_SIZE):
+                chunk = numpy.fromfile(f, dtype=dtype,
+                                       count=min(self.CHUNK_SIZE,
+                                                 count - start))
+                array[start:start + len(chunk)] = chunk
+        array.flush()
+        del array
+        os.remove(self._raw_path)
+
+
+class _NullWriter(object):
+    def write(self, records):
+        pass
+
+    def close(self):
+        pass
+
+
+def _create_writer(path):
+    if path is None:
+        return _NullWriter()
+    if path.endswith(".npy"):
+        return _NumpyWriter(path)
+    return _BinaryWriter(path)
+
+
+def _percentile(sorted_values, percent):
+    """Nearest-rank percentile of an already sorted, non-empty list"""
+    index = int(round(percent / 100. * (len(sorted_values) - 1)))
+    return sorted_values[index]
+
+
+class CaptureStatistics(object):
+    """
+    Throughput statistics of a running capture.
+    """
+
+    def __init__(self):
+        super(CaptureStatistics, self).__init__()
+        #: Time (float) when the capture was started.
+        self.start_time = time.time()
+        #: Total number of captured samples (int).
+        self.samples = 0
+        #: Total number of dropped samples (int).
+        self.dropped = 0
+        #: Latencies of the reads (list of float) since the last report.
+        self.latencies = []
+        self._report_time = self.start_time
+        self._report_samples = 0
+
+    def add_read(self, latency, samples, dropped=0):
+        """
+        Adds the result of one read operation.
+
+        :param float latency: Duration of the read in Seconds.
+        :param int samples: Number of received samples.
+        :param int dropped: Number of dropped samples.
+        """
+        self.latencies.append(latency)
+        self.samples += samples
+        self.dropped += dropped
+
+    def report(self):
+        """
+        Returns the statistics since the last report and resets the
+        latencies.
+
+        :return: One line of human readable statistics.
+        :rtype: str
+        """
+        now = time.time()
+        rate = (self.samples - self._report_samples) / \
+            max(now - self._report_time, 1e-9)
+        self._report_time = now
+        self._report_samples = self.samples
+        text = "{:8.1f} s  {:9d} samples  {:9.1f} Hz  {:6d} dropped".format(
+            now - self.start_time, self.samples, rate, self.dropped)
+        if self.latencies:
+            latencies = sorted(self.latencies)
+            text += "  latency p50/p95/p99: {:.2f}/{:.2f}/{:.2f} ms".format(
+                *[_percentile(latencies, p) * 1e3 for p in (50, 95, 99)])
+        self.latencies = []
+        return text
+
+    def summary(self):
+        """
+        Returns the overall statistics since the start of the capture.
+
+        :return: One line of human readable statistics.
+        :rtype: str
+        """
+        duration = time.time() - self.start_time
+        return "Total: {:.1f} s  {:d} samples  {:.1f} Hz  {:d} dropped".format(
+            duration, self.samples, self.samples / max(duration, 1e-9),
+            self.dropped)
+
+
+def capture_polled(devices, writer, statistics, rate, stop):
+    """
+    Reads all devices at the given rate. Read slots which could not be kept
+    because the previous reads took too long are counted as dropped.
+
+    :param list devices: The measuring devices, one per channel.
+    :param writer: Object with a ``write(records)`` method.
+    :param CaptureStatistics statistics: The statistics to update.
+    :param float rate: The sample rate in Hz, or 0 for as fast as possible.
+    :param callable stop: Returns True when the capture shall be stopped.
+    """
+    interval = 1. / rate if rate else 0.
+    next_read = time.time()
+    while not stop():
+        now = time.time()
+        if now < next_read:
+            time.sleep(next_read - now)
+        elif interval and now - next_read >= interval:
+            missed = int((now - next_read) / interval)
+            next_read += missed * interval
+            statistics.dropped += missed * len(devices)
+        next_read += interval
+        for channel, device in enumerate(devices):
+            start = time.time()
+            sample = device.read_timestamped_measurement()
+            statistics.add_read(time.time() - start, 1)
+            writer.write([(channel,) + sample])
+
+
+def capture_buffered(devices, writer, statistics, rate, stop,
+                     poll_interval=0.05):
+    """
+    Lets the SensorBridge read the devices at the given rate and fetches the
+    buffered samples periodically.
+
+    :param list devices: The measuring devices, one per channel.
+    :param writer: Object with a ``write(records)`` method.
+    :param CaptureStatistics statistics: The statistics to update.
+    :param float rate: The sample rate in Hz.
+    :param callable stop: Returns True when the capture shall be stopped.
+    :param float poll_interval: Interval in Seconds to read the buffers.
+    """
+    interval = 1. / rate
+    for device in devices:
+        device.start_buffered_measurement(interval)
+    try:
+        while not stop():
+            time.sleep(poll_interval)
+            for channel, device in enumerate(devices):
+                start = time.time()
+                measurements, lost = \
+                    device.read_timestamped_buffered_measurements()
+                statistics.add_read(time.time() - start, len(measurements),
+                                    lost)
+                writer.write([(channel,) + m for m in measurements])
+    finally:
+        for device in devices:
+            device.stop_buffered_measurement()
+
+
+def main(argv=None):
+    """
+    Entry point of the ``sfm-capture`` console script.
+    """
+    parser = argparse.ArgumentParser(
+        description="Capture measurements of SFM sensors connected to a "
+                    "SensorBridge into a file.")
+    add_sensor_bridge_arguments(parser)
+    parser.add_argument("-o", "--output",
+                        help="Output file, .npy for NumPy format, otherwise "
+                             "compact binary records. Omit to only show the "
+                             "statistics.")
+    parser.add_argument("-r", "--rate", type=float, default=0.,
+                        help="Sample rate in Hz, 0 for as fast as possible "
+                             "(default: %(default)s).")
+    parser.add_argument("--buffered", action="store_true",
+                        help="Let the SensorBridge sample at the given rate "
+                             "and read its buffer periodically.")
+    parser.add_argument("-d", "--duration", type=float,
+                        help="Capture duration in Seconds (default: until "
+                             "interrupted).")
+    parser.add_argument("--stats-interval", type=float, default=1.,
+                        help="Interval in Seconds for showing statistics "
+                             "(default: %(default)s).")
+    args = parser.parse_args(argv)
+    if args.buffered and not args.rate:
+        parser.error("--buffered requires --rate.")
+
+    if args.output is not None and args.output.endswith(".npy"):
+        _import_numpy(".npy files")  # Fail before setting up the sensors.
+
+    with open_sensor_bridge(args) as bridge:
+        devices = create_devices(bridge, args)
+        for channel, device in enumerate(devices):
+            print("Channel {}: flow unit {}".format(channel, device.flow_unit),
+                  file=sys.stderr)
+        statistics = CaptureStatistics()
+        end_time = None if args.duration is None else \
+            statistics.start_time + args.duration
+        next_report = [statistics.start_time + args.stats_interval]
+
+        def stop():
+            now = time.time()
+            if now >= next_report[0]:
+                next_report[0] = now + args.stats_interval
+                print(statistics.report(), file=sys.stderr)
+            return (end_time is not None) and (now >= end_time)
+
+        capture = capture_buffered if args.buffered else capture_polled
+        writer = None
+        try:
+            # Created once the sensors are up, to not leave a file behind if
+            # setting them up fails.
+            writer = _create_writer(args.output)
+            with profile_from_environment():
+                capture(devices, writer, statistics, args.rate, stop)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if writer is not None:
+                writer.close()
+            for device in devices:
+                device.stop_continuous_measurement()
+        print(statistics.summary(), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
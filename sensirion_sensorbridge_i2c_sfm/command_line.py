@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+# (c) Copyright 2020 Sensirion AG, Switzerland
+
+"""
+Helpers shared by the console scripts of this package.
+"""
+
+from __future__ import absolute_import, division, print_function
+from contextlib import contextmanager
+
+from .sfm3019.sfm3019_constants import MeasurementMode, \
+    SFM3019_DEFAULT_I2C_FREQUENCY, SFM3019_DEFAULT_VOLTAGE
+
+
+def _int_auto_base(value):
+    return int(value, 0)
+
+
+def add_sensor_bridge_arguments(parser):
+    """
+    Adds the arguments to select the SensorBridge and sensors to an argument
+    parser.
+
+    :param argparse.ArgumentParser parser:
+        The parser to extend.
+    """
+    group = parser.add_argument_group("SensorBridge")
+    group.add_argument("--serial-port", default="/dev/ttyUSB0",
+                       help="Serial port of the SensorBridge "
+                            "(default: %(default)s).")
+    group.add_argument("--baudrate", type=int, default=460800,
+                       help="Baudrate of the SensorBridge "
+                            "(default: %(default)s).")
+    group.add_argument("--bridge-address", type=int, default=0,
+                       help="SHDLC slave address of the SensorBridge "
+                            "(default: %(default)s).")
+    group.add_argument("--port", dest="ports", action="append",
+                       choices=["ONE", "TWO"],
+                       help="SensorBridge port with a connected sensor, may "
+                            "be given multiple times (default: ONE).")
+    group.add_argument("--i2c-frequency", type=float,
+                       default=SFM3019_DEFAULT_I2C_FREQUENCY,
+                       help="I2C frequency in Hz (default: %(default)s).")
+    group.add_argument("--supply-voltage", type=float,
+                       default=SFM3019_DEFAULT_VOLTAGE,
+                       help="Sensor supply voltage (default: %(default)s).")
+    group.add_argument("--simulate", action="store_true",
+                       help="Use a simulated SensorBridge with a simulated "
+                            "sensor on each port instead of the hardware.")
+    group.add_argument("--simulated-latency", type=float, default=0.001,
+                       help="Round trip time of the simulated SensorBridge in "
+                            "Seconds (default: %(default)s).")
+    group = parser.add_argument_group("Sensor")
+    group.add_argument("--i2c-address", type=_int_auto_base, default=0x2E,
+                       help="I2C address of the sensors (default: 0x2E).")
+    group.add_argument("--mode", default="Air",
+                       choices=[mode.name for mode in MeasurementMode],
+                       help="Measurement mode (default: %(default)s).")
+    group.add_argument("--o2-fraction", type=int, default=200,
+                       help="O2 volume fraction in permille for the AirO2Mix "
+                            "mode (default: %(default)s).")
+
+
+def parse_socket_address(address):
+    """
+    Parses a socket address given on the command line.
+
+    :param str address:
+        Either ``unix:<path>`` for a Unix socket, or ``<host>:<port>`` for
+        a TCP socket.
+    :return:
+        The path (str) of a Unix socket, or a tuple (host, port) for TCP.
+    :rtype:
+        str/tuple
+    """
+    if address.startswith("unix:"):
+        return address[len("unix:"):]
+    host, _, port = address.rpartition(":")
+    return host or "127.0.0.1", int(port)
+
+
+@contextmanager
+def open_sensor_bridge(args):
+    """
+    Opens the SensorBridge selected by the arguments added by
+    :py:func:`add_sensor_bridge_arguments`.
+
+    :param argparse.Namespace args:
+        The parsed arguments.
+    :return:
+        Context manager yielding the SensorBridge device.
+    """
+    if args.simulate:
+        from .simulation import SimulatedSensorBridge
+        yield SimulatedSensorBridge(latency=args.simulated_latency)
+        return
+    from sensirion_shdlc_driver import ShdlcSerialPort, ShdlcConnection
+    from sensirion_shdlc_sensorbridge import SensorBridgeShdlcDevice
+    with ShdlcSerialPort(port=args.serial_port,
+                         baudrate=args.baudrate) as port:
+        yield SensorBridgeShdlcDevice(ShdlcConnection(port),
+                                      slave_address=args.bridge_address)
+
+
+def create_devices(bridge, args):
+    """
+    Configures the selected SensorBridge ports, initializes the sensors and
+    starts their continuous measurement.
+
+    :param ~sensirion_shdlc_sensorbridge.device.SensorBridgeShdlcDevice bridge:
+        The SensorBridge to use.
+    :param argparse.Namespace args:
+        The parsed arguments, see :py:func:`add_sensor_bridge_arguments`.
+    :return:
+        The measuring devices, in the order of the given ports.
+    :rtype:
+        list(~sensirion_sensorbridge_i2c_sfm.sfm3019.device.Sfm3019I2cSensorBridgeDevice)
+    """
+    from sensirion_shdlc_sensorbridge import SensorBridgePort
+    from .sfm3019.device import Sfm3019I2cSensorBridgeDevice
+    measure_mode = MeasurementMode[args.mode]
+    devices = []
+    for name in args.ports or ["ONE"]:
+        port = SensorBridgePort[name]
+        bridge.set_i2c_frequency(port, frequency=args.i2c_frequency)
+        bridge.set_supply_voltage(port, voltage=args.supply_voltage)
+        bridge.switch_supply_on(port)
+        device = Sfm3019I2cSensorBridgeDevice(bridge, port,
+                                              slave_address=args.i2c_address)
+        device.initialize_sensor(measure_mode)
+        device.start_continuous_measurement(
+            measure_mode, air_o2_mix_fraction_permille=args.o2_fraction)
+        devices.append(device)
+    return devices
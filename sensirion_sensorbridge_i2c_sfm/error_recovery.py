@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+# (c) Copyright 2020 Sensirion AG, Switzerland
+
+from __future__ import absolute_import, division, print_function
+
+from .sensirion_word_command import I2cChecksumError
+
+#: Wrong CRC in the data received from the sensor.
+ERROR_CHECKSUM = "checksum"
+#: The sensor did not acknowledge, e.g. because it is not measuring.
+ERROR_NACK = "nack"
+#: The sensor stretched the clock longer than the I²C timeout.
+ERROR_I2C_TIMEOUT = "i2c_timeout"
+#: The SensorBridge did not respond in time.
+ERROR_BRIDGE_TIMEOUT = "bridge_timeout"
+#: Any other error reported by the SHDLC layer (e.g. a corrupt frame).
+ERROR_COMMUNICATION = "communication"
+
+ALL_ERROR_CATEGORIES = (ERROR_CHECKSUM, ERROR_NACK, ERROR_I2C_TIMEOUT,
+                        ERROR_BRIDGE_TIMEOUT, ERROR_COMMUNICATION)
+
+
+def classify_error(error):
+    """
+    Determines the category of a communication error.
+
+    :param Exception error:
+        The error raised while executing a command.
+    :return:
+        One of the ``ERROR_*`` categories, or None if the error is not a
+        communication error (and thus must not be recovered from).
+    :rtype:
+        str/None
+    """
+    if isinstance(error, I2cChecksumError):
+        return ERROR_CHECKSUM
+    # Imported here since they are only needed once an error occurred, which
+    # keeps them out of the import time of the device.
+    from sensirion_shdlc_driver.errors import ShdlcError, ShdlcTimeoutError
+    from sensirion_shdlc_sensorbridge.device_errors import \
+        SensorBridgeI2cNackError, SensorBridgeI2cTimeoutError
+    if isinstance(error, SensorBridgeI2cNackError):
+        return ERROR_NACK
+    if isinstance(error, SensorBridgeI2cTimeoutError):
+        return ERROR_I2C_TIMEOUT
+    if isinstance(error, ShdlcTimeoutError):
+        return ERROR_BRIDGE_TIMEOUT
+    if isinstance(error, ShdlcError):
+        return ERROR_COMMUNICATION
+    return None
+
+
+class RecoveryStatistics(object):
+    """
+    Counters about the errors which occurred while reading measurements and
+    how they were handled.
+    """
+
+    def __init__(self):
+        super(RecoveryStatistics, self).__init__()
+        self.reset()
+
+    def reset(self):
+        """
+        Resets all counters to zero.
+        """
+        #: Number of measurement reads (int).
+        self.reads = 0
+        #: Number of errors (int) per error category (str).
+        self.errors = dict((category, 0) for category in ALL_ERROR_CATEGORIES)
+        #: Number of retried reads (int).
+        self.retries = 0
+        #: Number of reads (int) which succeeded after at least one retry.
+        self.recovered = 0
+        #: Number of times (int) the continuous measurement was restarted.
+        self.restarts = 0
+        #: Number of reads (int) which failed although retrying.
+        self.failures = 0
+
+    @property
+    def total_errors(self):
+        """
+        :return: Total number of errors of all categories.
+        :rtype: int
+        """
+        return sum(self.errors.values())
+
+    def __repr__(self):
+        return ("RecoveryStatistics(reads={}, errors={}, retries={}, "
+                "recovered={}, restarts={}, failures={})"
+                .format(self.reads, self.total_errors, self.retries,
+                        self.recovered, self.restarts, self.failures))
+
+
+class RecoveryPolicy(object):
+    """
+    Defines how a device recovers from communication errors while reading
+    measurements, see
+    :py:class:`~sensirion_sensorbridge_i2c_sfm.sfm3019.device.Sfm3019I2cSensorBridgeDevice`.
+
+    A failed read is retried immediately, so a transient bus glitch only
+    costs one sample. The continuous measurement is restarted only if the
+    sensor seems to have lost its state, i.e. after an error of a category
+    listed in ``restart_on`` or after ``restart_after`` consecutive errors.
+    It is restarted at most once per read: the restart waits until the
+    sensor delivers results again, and restarting during the warm-up would
+    only delay the first result further. The scale factors read during
+    initialization are kept in any case.
+    """
+
+    def __init__(self, max_retries=3, restart_after=2,
+                 restart_on=(ERROR_NACK,),
+                 recoverable=ALL_ERROR_CATEGORIES):
+        """
+        Creates a recovery policy.
+
+        :param int max_retries:
+            Maximum number of retries of a failed read before the error is
+            raised. Defaults to 3.
+        :param int/None restart_after:
+            Number of consecutive failed attempts after which the continuous
+            measurement is restarted before retrying. None disables it.
+            Defaults to 2.
+        :param iterable restart_on:
+            Error categories which restart the continuous measurement
+            immediately. Defaults to NACK errors since the sensor does not
+            acknowledge reads when it is not measuring (e.g. after a reset).
+        :param iterable recoverable:
+            Error categories to recover from. Errors of other categories are
+            raised immediately. Defaults to all categories.
+        """
+        super(RecoveryPolicy, self).__init__()
+        if max_retries < 0:
+            raise ValueError("max_retries must not be negative.")
+        self.max_retries = max_retries
+        self.restart_after = restart_after
+        self.restart_on = frozenset(restart_on)
+        self.recoverable = frozenset(recoverable)
+
+    def execute(self, read, restart, statistics):
+        """
+        Executes a read operation according to this policy.
+
+        :param callable read:
+            Function performing the read, without arguments.
+        :param callable restart:
+            Function restarting the continuous measurement and waiting until
+            its first result is available, without arguments. Returns whether
+            the measurement was restarted (False if it is not running).
+        :param RecoveryStatistics statistics:
+            The statistics to update.
+        :return:
+            The return value of ``read``.
+        :raise:
+            The last error if the read did not succeed within the allowed
+            number of retries, or any error which is not recoverable.
+        """
+        statistics.reads += 1
+        consecutive_errors = 0
+        restart_attempted = False
+        while True:
+            try:
+                result = read()
+            except Exception as e:
+                category = classify_error(e)
+                if category is None:
+                    raise
+                statistics.errors[category] += 1
+                consecutive_errors += 1
+                if category not in self.recoverable or \
+                        consecutive_errors > self.max_retries:
+                    statistics.failures += 1
+                    raise
+                statistics.retries += 1
+                if not restart_attempted and \
+                        (category in self.restart_on or
+                         (self.restart_after is not None and
+                          consecutive_errors >= self.restart_after)):
+                    restart_attempted = True
+                    try:
+                        if restart():
+                            statistics.restarts += 1
+                    except Exception as e:
+                        restart_category = classify_error(e)
+                        if restart_category is None:
+                            raise
+                        statistics.errors[restart_category] += 1
+                continue
+            if consecutive_errors:
+                statistics.recovered += 1
+            return result
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+# (c) Copyright 2020 Sensirion AG, Switzerland
+
+"""
+Support for lazily loaded package attributes (PEP 562), so that importing a
+package does not import all of its subsystems.
+"""
+
+from __future__ import absolute_import, division, print_function
+import importlib
+import sys
+
+
+def lazy_attributes(package, attributes, eager=()):
+    """
+    Creates the module level ``__getattr__`` and ``__dir__`` functions of a
+    package whose attributes are imported on first access.
+
+    On Python versions without PEP 562 support (< 3.7), only the attributes
+    listed in ``eager`` are imported immediately instead. The other ones are
+    not available as package attributes there, but can still be imported
+    from their modules.
+
+    :param str package:
+        Name of the package, i.e. ``__name__``.
+    :param dict attributes:
+        Maps the attribute names to tuples of the relative module name and
+        the name of the object within that module, or None to get the module
+        itself.
+    :param iterable eager:
+        Names of the attributes to import immediately on Python < 3.7, i.e.
+        the attributes the package is expected to provide everywhere.
+    :return:
+        The ``__getattr__`` and ``__dir__`` functions for the package.
+    :rtype:
+        tuple
+    """
+    def __getattr__(name):
+        try:
+            module_name, object_name = attributes[name]
+        except KeyError:
+            raise AttributeError("module '{}' has no attribute '{}'"
+                                 .format(package, name))
+        value = importlib.import_module(module_name, package)
+        if object_name is not None:
+            value = getattr(value, object_name)
+        setattr(sys.modules[package], name, value)
+        return value
+
+    def __dir__():
+        return sorted(set(vars(sys.modules[package])) | set(attributes))
+
+    if sys.version_info < (3, 7):
+        for name in eager:
+            __getattr__(name)
+    return __getattr__, __dir__
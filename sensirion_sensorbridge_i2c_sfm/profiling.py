@@ -0,0 +1,345 @@
+# -*- coding: utf-8 -*-
+# (c) Copyright 2020 Sensirion AG, Switzerland
+
+"""
+Opt-in profiling of the acquisition stack.
+
+While an :py:class:`AcquisitionProfiler` is active, the layers of the stack
+are timed (exclusive of the layers they call) and, optionally, the peak
+memory they allocate is traced with :py:mod:`tracemalloc`. Everything outside
+of the device read methods is accounted to the consumer. Example::
+
+    with AcquisitionProfiler() as profiler:
+        for _ in range(1000):
+            device.read_continuous_measurement()
+    print(profiler.report())
+
+The console scripts of this package enable the profiler if the environment
+variable ``SFM_PROFILE`` is set (to the sampling interval, e.g. ``1`` to
+profile every read) and print the report at the end. Set
+``SFM_PROFILE_ALLOCATIONS=1`` to trace allocations too.
+"""
+
+from __future__ import absolute_import, division, print_function
+from contextlib import contextmanager
+import os
+import sys
+import threading
+import timeit
+
+from .crc_calculator import CrcCalculator
+from .sensirion_word_command import SensirionWordI2cCommand
+from .sfm3019.device import Sfm3019I2cSensorBridgeDevice
+
+STAGE_BRIDGE = "bridge"
+STAGE_BUILD_TX_DATA = "_build_tx_data"
+STAGE_CRC = "crc"
+STAGE_INTERPRET_RESPONSE = "interpret_response"
+STAGE_CONVERT = "_convert_measurement_data"
+STAGE_DEVICE = "device"
+STAGE_CONSUMER = "consumer"
+
+#: All stages in the order of the report.
+STAGES = (STAGE_BRIDGE, STAGE_BUILD_TX_DATA, STAGE_CRC,
+          STAGE_INTERPRET_RESPONSE, STAGE_CONVERT, STAGE_DEVICE,
+          STAGE_CONSUMER)
+
+_clock = timeit.default_timer
+
+
+def _bridge_classes():
+    """The SensorBridge classes whose I/O methods are profiled"""
+    from .simulation import SimulatedSensorBridge
+    classes = [SimulatedSensorBridge]
+    try:
+        from sensirion_shdlc_sensorbridge import SensorBridgeShdlcDevice
+        classes.append(SensorBridgeShdlcDevice)
+    except ImportError:
+        pass
+    return classes
+
+
+def _command_classes():
+    """
+    The word command classes whose responses are profiled. They are listed
+    explicitly since old-style classes (Python 2.7) have no
+    ``__subclasses__()``.
+    """
+    from .sfm3019 import commands
+    classes = [SensirionWordI2cCommand]
+    for value in vars(commands).values():
+        if isinstance(value, type(SensirionWordI2cCommand)) and \
+                issubclass(value, SensirionWordI2cCommand) and \
+                value not in classes:
+            classes.append(value)
+    return classes
+
+
+class StageStatistics(object):
+    """
+    Accumulated measurements of one stage.
+    """
+
+    def __init__(self):
+        super(StageStatistics, self).__init__()
+        #: Number of profiled calls (int).
+        self.calls = 0
+        #: Exclusive time (float) of the profiled calls in Seconds.
+        self.time = 0.0
+        #: Sum of the peak memory in bytes (int) allocated by the profiled
+        #: calls above the memory in use when they were called, including
+        #: the called stages (unlike :py:attr:`time`) and temporary
+        #: allocations. Only available when tracing allocations.
+        self.peak_bytes = 0
+
+
+class AcquisitionProfiler(object):
+    """
+    Context manager profiling the acquisition stack, see
+    :py:mod:`~sensirion_sensorbridge_i2c_sfm.profiling`.
+
+    To keep the overhead low, only every n-th device read can be profiled
+    (``sample_every``); the unprofiled reads run without any instrumentation
+    and the report is extrapolated.
+    """
+
+    def __init__(self, sample_every=1, trace_allocations=False):
+        """
+        :param int sample_every:
+            Profile only every n-th device read. Defaults to 1.
+        :param bool trace_allocations:
+            Whether to trace the peak memory allocated by each stage with
+            :py:mod:`tracemalloc` (Python 3.9 or newer), which slows down the
+            acquisition considerably. Allocations of other threads are
+            included. Defaults to False.
+        """
+        super(AcquisitionProfiler, self).__init__()
+        if sample_every < 1:
+            raise ValueError("sample_every must be at least 1.")
+        self._sample_every = sample_every
+        self._tracemalloc = None
+        if trace_allocations:
+            import tracemalloc
+            if not hasattr(tracemalloc, "reset_peak"):
+                raise RuntimeError("Tracing allocations requires Python 3.9 "
+                                   "or newer.")
+            self._tracemalloc = tracemalloc
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._patches = []
+        self._started_tracemalloc = False
+        self.reset()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def reset(self):
+        """
+        Discards all measurements.
+        """
+        #: Statistics (:py:class:`StageStatistics`) per stage (str).
+        self.stages = dict((stage, StageStatistics()) for stage in STAGES)
+        #: Number of decoded samples (int) within profiled reads.
+        self.samples = 0
+        #: Number of device reads (int), profiled or not.
+        self.reads = 0
+        #: Number of profiled device reads (int).
+        self.profiled_reads = 0
+        self._acquisition_time = 0.0
+        self._start_time = None
+        self._elapsed = 0.0
+
+    def start(self):
+        """
+        Installs the instrumentation.
+        """
+        self._patch(Sfm3019I2cSensorBridgeDevice, "read_continuous_measurement",
+                    STAGE_DEVICE, outer=True)
+        self._patch(Sfm3019I2cSensorBridgeDevice,
+                    "read_timestamped_buffered_measurements", STAGE_DEVICE,
+                    outer=True)
+        self._patch(Sfm3019I2cSensorBridgeDevice, "_convert_measurement_data",
+                    STAGE_CONVERT, count_samples=True)
+        self._patch(SensirionWordI2cCommand, "_build_tx_data",
+                    STAGE_BUILD_TX_DATA)
+        self._patch(CrcCalculator, "__call__", STAGE_CRC)
+        for cls in _command_classes():
+            if "interpret_response" in vars(cls):
+                self._patch(cls, "interpret_response",
+                            STAGE_INTERPRET_RESPONSE)
+        for cls in _bridge_classes():
+            for name in ("transceive_i2c", "read_buffer"):
+                if name in vars(cls):
+                    self._patch(cls, name, STAGE_BRIDGE)
+        if self._tracemalloc and not self._tracemalloc.is_tracing():
+            self._tracemalloc.start()
+            self._started_tracemalloc = True
+        self._start_time = _clock()
+
+    def stop(self):
+        """
+        Removes the instrumentation.
+        """
+        if self._start_time is not None:
+            self._elapsed += _clock() - self._start_time
+            self._start_time = None
+        for cls, name, original in reversed(self._patches):
+            setattr(cls, name, original)
+        self._patches = []
+        if self._started_tracemalloc:
+            self._tracemalloc.stop()
+            self._started_tracemalloc = False
+
+    def _state(self):
+        local = self._local
+        if not hasattr(local, "stack"):
+            local.stack = []
+            local.outer_depth = 0
+            local.active = False
+        return local
+
+    def _patch(self, cls, name, stage, outer=False, count_samples=False):
+        original = vars(cls)[name]
+        is_static = isinstance(original, staticmethod)
+        function = original.__func__ if is_static else original
+        profiler = self
+
+        def wrapper(*args, **kwargs):
+            state = profiler._state()
+            if outer:
+                if state.outer_depth == 0:
+                    with profiler._lock:
+                        profiler.reads += 1
+                        state.active = \
+                            profiler.reads % profiler._sample_every == 0
+                        if state.active:
+                            profiler.profiled_reads += 1
+                state.outer_depth += 1
+            try:
+                if not state.active:
+                    return function(*args, **kwargs)
+                if count_samples:
+                    with profiler._lock:
+                        profiler.samples += 1
+                return profiler._measure(state, stage, function, args, kwargs)
+            finally:
+                if outer:
+                    state.outer_depth -= 1
+                    if state.outer_depth == 0:
+                        state.active = False
+
+        wrapper.__name__ = function.__name__
+        wrapper.__doc__ = function.__doc__
+        self._patches.append((cls, name, original))
+        setattr(cls, name, staticmethod(wrapper) if is_static else wrapper)
+
+    def _measure(self, state, stage, function, args, kwargs):
+        stack = state.stack
+        if stack and stack[-1][2] == stage:
+            # E.g. an override calling the method of its base class, which
+            # is accounted to the calling measurement.
+            return function(*args, **kwargs)
+        tracemalloc = self._tracemalloc
+        tracing = tracemalloc is not None and tracemalloc.is_tracing()
+        memory = 0
+        if tracing:
+            # The peak is reset for each call, so the peak reached so far by
+            # the calling stage has to be saved first.
+            memory, peak = tracemalloc.get_traced_memory()
+            if stack:
+                stack[-1][1] = max(stack[-1][1], peak)
+            tracemalloc.reset_peak()
+        # Time of the called stages (to be subtracted), the highest peak
+        # memory reached by them and the stage.
+        frame = [0.0, memory, stage]
+        stack.append(frame)
+        start = _clock()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            elapsed = _clock() - start
+            stack.pop()
+            peak = max(frame[1], tracemalloc.get_traced_memory()[1]) \
+                if tracing else memory
+            if stack:
+                stack[-1][0] += elapsed
+                stack[-1][1] = max(stack[-1][1], peak)
+            with self._lock:
+                statistics = self.stages[stage]
+                statistics.calls += 1
+                statistics.time += elapsed - frame[0]
+                statistics.peak_bytes += peak - memory
+                if not stack:
+                    self._acquisition_time += elapsed
+
+    def report(self):
+        """
+        Creates a report with the time and peak allocated memory per sample
+        of each stage. The time excludes the called stages, while the peak
+        memory includes them. The consumer stage is the time spent outside of
+        the device read methods, e.g. in the application processing the
+        samples.
+
+        :return: The report as human readable table.
+        :rtype: str
+        """
+        elapsed = self._elapsed
+        if self._start_time is not None:
+            elapsed += _clock() - self._start_time
+        samples = max(self.samples, 1)
+        # Extrapolate the unprofiled reads.
+        scale = self.reads / max(self.profiled_reads, 1)
+        total_samples = self.samples * scale
+        consumer_time = max(elapsed - self._acquisition_time * scale, 0.0)
+        times = dict((stage, self.stages[stage].time / samples)
+                     for stage in STAGES)
+        times[STAGE_CONSUMER] = consumer_time / max(total_samples, 1)
+        total = sum(times.values())
+
+        lines = ["Acquisition profile: {:.0f} samples in {:.3f} s ({} of {} "
+                 "reads profiled)".format(total_samples, elapsed,
+                                          self.profiled_reads, self.reads),
+                 "{:<28}{:>14}{:>16}{:>10}{:>28}".format(
+                     "stage", "calls/sample", "excl. us/sample", "share",
+                     "incl. peak bytes/sample")]
+        for stage in STAGES:
+            statistics = self.stages[stage]
+            calls = "" if stage == STAGE_CONSUMER else \
+                "{:.2f}".format(statistics.calls / samples)
+            allocated = "{:.1f}".format(statistics.peak_bytes / samples) \
+                if self._tracemalloc and stage != STAGE_CONSUMER else ""
+            lines.append("{:<28}{:>14}{:>16.2f}{:>9.1f}%{:>28}".format(
+                stage, calls, times[stage] * 1e6,
+                100. * times[stage] / total if total else 0., allocated))
+        lines.append("{:<28}{:>14}{:>16.2f}".format("total", "", total * 1e6))
+        return "\n".join(lines)
+
+
+@contextmanager
+def profile_from_environment(output=None):
+    """
+    Profiles the enclosed code if the environment variable ``SFM_PROFILE``
+    is set, and prints the report at the end.
+
+    :param file output:
+        Where to print the report, defaults to ``sys.stderr``.
+    :return:
+        Context manager yielding the active
+        :py:class:`AcquisitionProfiler`, or None if profiling is disabled.
+    """
+    sample_every = os.environ.get("SFM_PROFILE")
+    if not sample_every:
+        yield None
+        return
+    profiler = AcquisitionProfiler(
+        sample_every=int(sample_every),
+        trace_allocations=bool(os.environ.get("SFM_PROFILE_ALLOCATIONS")))
+    try:
+        with profiler:
+            yield profiler
+    finally:
+        print(profiler.report(), file=output or sys.stderr)
@@ -0,0 +1,552 @@
+# -*- coding: utf-8 -*-
+# (c) Copyright 2020 Sensirion AG, Switzerland
+
+"""
+Server to share the measurements of the sensors connected to one SensorBridge
+with any number of clients over TCP or Unix sockets.
+
+The server streams batched binary frames. Every frame starts with a header
+(magic ``SFMS``, frame type, channel and payload length, little endian):
+
+- Info frame (type 1), sent once after connecting: UTF-8 encoded JSON object
+  describing the channels (one channel per device).
+- Sample frame (type 2): sequence number of the first sample (uint64)
+  followed by the samples, each consisting of timestamp, flow and
+  temperature (3 doubles).
+
+Sequence numbers are counted per channel, so clients can detect samples
+which were dropped because they did not read fast enough.
+"""
+
+from __future__ import absolute_import, division, print_function
+from collections import deque
+from struct import Struct
+import argparse
+import json
+import logging
+import os
+import socket
+import stat
+import threading
+import time
+
+from .command_line import add_sensor_bridge_arguments, create_devices, \
+    open_sensor_bridge, parse_socket_address
+from .profiling import profile_from_environment
+
+log = logging.getLogger(__name__)
+
+FRAME_HEADER = Struct("<4sBxHI")
+FRAME_MAGIC = b"SFMS"
+FRAME_TYPE_INFO = 1
+FRAME_TYPE_SAMPLES = 2
+SAMPLES_HEADER = Struct("<Q")
+SAMPLE = Struct("<ddd")
+
+
+def _create_socket(address):
+    if isinstance(address, tuple):
+        return socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    return socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+
+
+def _remove_stale_socket(path):
+    """Remove a Unix socket file left behind, but never any other file"""
+    try:
+        if stat.S_ISSOCK(os.stat(path).st_mode):
+            os.unlink(path)
+    except OSError:
+        pass
+
+
+def encode_frame(frame_type, channel, payload):
+    """
+    Encodes a frame of the sample stream protocol.
+
+    :param int frame_type: The frame type.
+    :param int channel: The channel the payload belongs to.
+    :param bytes payload: The payload.
+    :return: The encoded frame.
+    :rtype: bytes
+    """
+    return FRAME_HEADER.pack(FRAME_MAGIC, frame_type, channel,
+                             len(payload)) + payload
+
+
+class _ClientConnection(object):
+    """
+    A connected client with its own bounded frame queue, sent by a separate
+    thread. If the client does not keep up, the oldest frames are dropped so
+    the acquisition and other clients are not slowed down.
+    """
+
+    def __init__(self, sock, address, info_frame, queue_size, on_close):
+        self.socket = sock
+        self.address = address
+        self.dropped_samples = 0
+        # The info frame must be queued before the client gets published to
+        # the acquisition, so it is always the first frame sent.
+        self._queue = deque([(info_frame, 0)])
+        self._queue_size = queue_size
+        self._condition = threading.Condition()
+        self._closed = False
+        self._on_close = on_close
+        self._thread = threading.Thread(target=self._run,
+                                        name="sfm-client-{}".format(address))
+        self._thread.daemon = True
+
+    def start(self):
+        self._thread.start()
+
+    def put(self, frame, sample_count):
+        with self._condition:
+            if len(self._queue) >= self._queue_size:
+                self.dropped_samples += self._queue.popleft()[1]
+            self._queue.append((frame, sample_count))
+            self._condition.notify()
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+
+    def _run(self):
+        try:
+            while True:
+                with self._condition:
+                    while not self._queue and not self._closed:
+                        self._condition.wait()
+                    if self._closed:
+                        break
+                    frames = list(self._queue)
+                    self._queue.clear()
+                self.socket.sendall(b"".join(frame for frame, _ in frames))
+        except (IOError, OSError) as e:
+            log.info("Client {} disconnected: {}".format(self.address, e))
+        finally:
+            self.socket.close()
+            self._on_close(self)
+
+
+class SampleServer(object):
+    """
+    Owns the devices, reads their measurements continuously and streams them
+    in batches to all connected :py:class:`SampleClient` instances.
+    """
+
+    def __init__(self, devices, address, interval=0.0, batch_size=32,
+                 max_batch_delay=0.05, client_queue_size=256):
+        """
+        Creates the server and starts listening (but not yet acquiring).
+
+        :param list devices:
+            The initialized devices with started continuous measurement. The
+            index of a device in the list is its channel number.
+        :param str/tuple address:
+            A tuple (host, port) to listen on TCP, or the path (str) of a
+            Unix socket.
+        :param float interval:
+            Minimum time in Seconds between two reads of all devices.
+            Defaults to 0.0, i.e. reading as fast as possible.
+        :param int batch_size:
+            Maximum number of samples per frame. Defaults to 32.
+        :param float max_batch_delay:
+            Maximum time in Seconds a sample is held back to fill a batch.
+            Defaults to 0.05.
+        :param int client_queue_size:
+            Maximum number of frames queued per client before the oldest
+            frames are dropped. Defaults to 256.
+        """
+        self._devices = list(devices)
+        self._interval = interval
+        self._batch_size = batch_size
+        self._max_batch_delay = max_batch_delay
+        self._client_queue_size = client_queue_size
+        self._clients = []
+        self._clients_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._threads = []
+        self._error = None
+        self._info_frame = encode_frame(FRAME_TYPE_INFO, 0, json.dumps({
+            "channels": [{"flow_unit": device.flow_unit}
+                         for device in self._devices],
+        }).encode("utf-8"))
+
+        if not isinstance(address, tuple):
+            _remove_stale_socket(address)
+        self._address = address
+        self._socket = _create_socket(address)
+        try:
+            if isinstance(address, tuple):
+                self._socket.setsockopt(socket.SOL_SOCKET,
+                                        socket.SO_REUSEADDR, 1)
+            self._socket.bind(address)
+            self._socket.listen(8)
+        except Exception:
+            self._socket.close()
+            raise
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    @property
+    def address(self):
+        """
+        :return: The address the server is listening on.
+        :rtype: str/tuple
+        """
+        return self._socket.getsockname()
+
+    @property
+    def client_count(self):
+        """
+        :return: The number of connected clients.
+        :rtype: int
+        """
+        with self._clients_lock:
+            return len(self._clients)
+
+    def start(self):
+        """
+        Starts accepting clients and acquiring measurements in background
+        threads.
+        """
+        for target, name in [(self._accept_clients, "sfm-server-accept"),
+                             (self._acquire, "sfm-server-acquire")]:
+            thread = threading.Thread(target=target, name=name)
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+
+    def serve_forever(self):
+        """
+        Starts the server and blocks until :py:meth:`close` is called (e.g.
+        from another thread) or the acquisition fails.
+
+        :raise:
+            The error which stopped the acquisition.
+        """
+        self.start()
+        while not self._stop_event.wait(0.5):
+            pass
+        if self._error is not None:
+            raise self._error
+
+    def close(self):
+        """
+        Stops the acquisition and disconnects all clients.
+        """
+        self._stop_event.set()
+        try:
+            self._socket.shutdown(socket.SHUT_RDWR)
+        except (IOError, OSError):
+            pass
+        self._socket.close()
+        for thread in self._threads:
+            if thread is not threading.current_thread():
+                thread.join()
+        with self._clients_lock:
+            clients = list(self._clients)
+        for client in clients:
+            client.close()
+        if not isinstance(self._address, tuple):
+            _remove_stale_socket(self._address)
+
+    def _remove_client(self, client):
+        with self._clients_lock:
+            if client in self._clients:
+                self._clients.remove(client)
+
+    def _accept_clients(self):
+        while not self._stop_event.is_set():
+            try:
+                sock, address = self._socket.accept()
+            except (IOError, OSError):
+                break
+            if isinstance(self._address, tuple):
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            client = _ClientConnection(sock, address or "unix",
+                                       self._info_frame,
+                                       self._client_queue_size,
+                                       self._remove_client)
+            with self._clients_lock:
+                self._clients.append(client)
+            client.start()
+            log.info("Client {} connected.".format(client.address))
+
+    def _broadcast(self, channel, first_sequence, samples):
+        payload = bytearray(SAMPLES_HEADER.pack(first_sequence))
+        for sample in samples:
+            payload += SAMPLE.pack(*sample)
+        frame = encode_frame(FRAME_TYPE_SAMPLES, channel, bytes(payload))
+        with self._clients_lock:
+            clients = list(self._clients)
+        for client in clients:
+            client.put(frame, len(samples))
+
+    def _acquire(self):
+        sequences = [1] * len(self._devices)
+        batches = [[] for _ in self._devices]
+        batch_start = time.time()
+        next_read = time.time()
+        try:
+            while not self._stop_event.is_set():
+                delay = next_read - time.time()
+                if delay > 0:
+                    time.sleep(delay)
+                next_read += self._interval
+                for channel, device in enumerate(self._devices):
+                    batches[channel].append(
+                        device.read_timestamped_measurement())
+                now = time.time()
+                if len(batches[0]) < self._batch_size and \
+                        now - batch_start < self._max_batch_delay:
+                    continue
+                for channel, batch in enumerate(batches):
+                    self._broadcast(channel, sequences[channel], batch)
+                    sequences[channel] += len(batch)
+                    batches[channel] = []
+                batch_start = now
+        except Exception as e:
+            log.error("Acquisition failed: {}".format(e))
+            self._error = e
+            self._stop_event.set()
+
+
+class RemoteSfm3019Device(object):
+    """
+    A single channel of a :py:class:`SampleClient`, providing the same
+    measurement API as the local
+    :py:class:`~sensirion_sensorbridge_i2c_sfm.sfm3019.device.Sfm3019I2cSensorBridgeDevice`.
+    """
+
+    def __init__(self, client, channel):
+        self._client = client
+        self._channel = channel
+
+    @property
+    def flow_unit(self):
+        """
+        :return: The flow unit as a string according to datasheet
+        :rtype: str
+        """
+        return self._client.channels[self._channel]["flow_unit"]
+
+    def read_continuous_measurement(self):
+        """
+        Read the next measurement received from the server.
+
+        :return:
+            The measured flow and temperature
+
+            - flow (float) -
+              flow in unit specified by sensor.
+            - temperature (float) -
+              Temperature in degree C.
+        :rtype:
+            tuple
+        """
+        return self._client.read_continuous_measurement(self._channel)
+
+    def read_timestamped_measurement(self):
+        """
+        Read the next measurement received from the server, together with its
+        acquisition time.
+
+        :return:
+            The acquisition time (host time of the server in Seconds), the
+            flow and the temperature (all float).
+        :rtype:
+            tuple
+        """
+        return self._client.read_timestamped_measurement(self._channel)
+
+
+class SampleClient(object):
+    """
+    Client to receive the measurements streamed by a :py:class:`SampleServer`.
+
+    Samples are buffered per channel. Use :py:meth:`device` to get an object
+    with the same API as the local device, or iterate over the client to get
+    all samples of all channels in the order they are received.
+    """
+
+    def __init__(self, address, buffer_size=65536, timeout=None):
+        """
+        Connects to a server and receives the channel information.
+
+        :param str/tuple address:
+            A tuple (host, port) for TCP, or the path (str) of a Unix socket.
+        :param int buffer_size:
+            Maximum number of samples buffered per channel. Defaults to 65536.
+        :param float timeout:
+            Socket timeout in Seconds, or None (the default) to block
+            without timeout.
+        """
+        self._socket = _create_socket(address)
+        self._socket.settimeout(timeout)
+        self._socket.connect(address)
+        self._buffer = bytearray()
+        frame_type, _, payload = self._receive_frame()
+        if frame_type != FRAME_TYPE_INFO:
+            raise IOError("Unexpected frame type {} received."
+                          .format(frame_type))
+
+        #: Information about the channels (list of dict).
+        self.channels = json.loads(payload.decode("utf-8"))["channels"]
+
+        #: Number of samples (int) lost per channel since the first received
+        #: samples, either dropped by the server or discarded due to a full
+        #: buffer.
+        self.lost_samples = [0] * len(self.channels)
+
+        self._samples = [deque(maxlen=buffer_size) for _ in self.channels]
+        # Unknown until the first samples are received, since the server
+        # may have been running for a while already.
+        self._next_sequence = [None] * len(self.channels)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __iter__(self):
+        """
+        Endlessly yields the received samples, each as a tuple of channel
+        (int), timestamp, flow and temperature (all float).
+        """
+        while True:
+            channel, samples = self.read_samples()
+            for sample in samples:
+                yield (channel,) + sample
+
+    def device(self, channel=0):
+        """
+        :param int channel: The channel (index of the device on the server).
+        :return: An object with the API of a local device.
+        :rtype: RemoteSfm3019Device
+        """
+        return RemoteSfm3019Device(self, channel)
+
+    def close(self):
+        """
+        Disconnects from the server.
+        """
+        self._socket.close()
+
+    def _receive_exactly(self, length):
+        while len(self._buffer) < length:
+            data = self._socket.recv(max(65536, length - len(self._buffer)))
+            if not data:
+                raise IOError("Connection closed by server.")
+            self._buffer += data
+        data = bytes(self._buffer[:length])
+        del self._buffer[:length]
+        return data
+
+    def _receive_frame(self):
+        magic, frame_type, channel, length = \
+            FRAME_HEADER.unpack(self._receive_exactly(FRAME_HEADER.size))
+        if magic != FRAME_MAGIC:
+            raise IOError("Invalid frame received.")
+        return frame_type, channel, self._receive_exactly(length)
+
+    def read_samples(self):
+        """
+        Receives the next batch of samples, bypassing the per-channel buffers.
+
+        :return:
+            The channel (int) and the received samples, each as a tuple of
+            timestamp, flow and temperature (all float).
+        :rtype:
+            tuple
+        """
+        while True:
+            frame_type, channel, payload = self._receive_frame()
+            if frame_type != FRAME_TYPE_SAMPLES:
+                continue
+            sequence = SAMPLES_HEADER.unpack_from(payload)[0]
+            next_sequence = self._next_sequence[channel]
+            if next_sequence is not None and sequence > next_sequence:
+                self.lost_samples[channel] += sequence - next_sequence
+            samples = [SAMPLE.unpack_from(payload, offset) for offset in
+                       range(SAMPLES_HEADER.size, len(payload), SAMPLE.size)]
+            self._next_sequence[channel] = sequence + len(samples)
+            return channel, samples
+
+    def read_timestamped_measurement(self, channel=0):
+        """
+        Returns the next buffered measurement of a channel, receiving data
+        from the server if needed.
+
+        :param int channel: The channel to read.
+        :return: Timestamp, flow and temperature (all float).
+        :rtype: tuple
+        """
+        buffered = self._samples[channel]
+        while not buffered:
+            received_channel, samples = self.read_samples()
+            target = self._samples[received_channel]
+            overflow = len(target) + len(samples) - target.maxlen
+            if overflow > 0:
+                self.lost_samples[received_channel] += overflow
+            target.extend(samples)
+        return buffered.popleft()
+
+    def read_continuous_measurement(self, channel=0):
+        """
+        Returns the next measurement of a channel, like
+        :py:meth:`~sensirion_sensorbridge_i2c_sfm.sfm3019.device.Sfm3019I2cSensorBridgeDevice.read_continuous_measurement`.
+
+        :param int channel: The channel to read.
+        :return: Flow and temperature (both float).
+        :rtype: tuple
+        """
+        return self.read_timestamped_measurement(channel)[1:]
+
+
+def main(argv=None):
+    """
+    Entry point of the ``sfm-sample-server`` console script.
+    """
+    parser = argparse.ArgumentParser(
+        description="Serve the measurements of SFM sensors connected to a "
+                    "SensorBridge to clients over TCP or Unix sockets.")
+    add_sensor_bridge_arguments(parser)
+    parser.add_argument("--listen", default="127.0.0.1:5020",
+                        help="Address to listen on, either <host>:<port> or "
+                             "unix:<path> (default: %(default)s).")
+    parser.add_argument("--interval", type=float, default=0.0,
+                        help="Minimum read interval in Seconds "
+                             "(default: %(default)s).")
+    parser.add_argument("--batch-size", type=int, default=32,
+                        help="Maximum samples per frame "
+                             "(default: %(default)s).")
+    args = parser.parse_args(argv)
+    logging.basicConfig(format='%(asctime)s [%(levelname)s] %(message)s',
+                        level=logging.INFO)
+
+    with open_sensor_bridge(args) as bridge:
+        devices = create_devices(bridge, args)
+        server = SampleServer(devices, parse_socket_address(args.listen),
+                              interval=args.interval,
+                              batch_size=args.batch_size)
+        log.info("Listening on {}".format(args.listen))
+        try:
+            with profile_from_environment():
+                server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.close()
+            for device in devices:
+                device.stop_continuous_measurement()
+
+
+if __name__ == "__main__":
+    main()
@@ -2,7 +2,15 @@
 # (c) Copyright 2020 Sensirion AG, Switzerland
 
 from __future__ import absolute_import, division, print_function
-from .device import Sfm3019I2cSensorBridgeDevice  # noqa: F401
-from .sfm3019_constants import MeasurementMode  # noqa: F401
+from ..lazy_import import lazy_attributes
 
 __copyright__ = '(c) Copyright 2020 Sensirion AG, Switzerland'
+
+__all__ = ['Sfm3019I2cSensorBridgeDevice', 'MeasurementMode']
+
+__getattr__, __dir__ = lazy_attributes(__name__, {
+    'Sfm3019I2cSensorBridgeDevice': ('.device', 'Sfm3019I2cSensorBridgeDevice'),
+    'MeasurementMode': ('.sfm3019_constants', 'MeasurementMode'),
+    'discover_sensors': ('.discovery', 'discover_sensors'),
+    'MeasurementPoller': ('.polling', 'MeasurementPoller'),
+}, eager=__all__ + ['discover_sensors', 'MeasurementPoller'])
@@ -2,12 +2,15 @@
 # (c) Copyright 2020 Sensirion AG, Switzerland
 
 from __future__ import absolute_import, division, print_function
+import time
 
 from .commands import Sfm3019I2cCmdReadMeas, \
     Sfm3019I2cCmdReadProductIdentifierAndSerialNumber, \
     Sfm3019I2cCmdStartMeasAir, Sfm3019I2cCmdStartMeasAirO2Mix, \
     Sfm3019I2cCmdStartMeasO2, Sfm3019I2cCmdStopMeas, \
     Sfm3019I2cCmdGetUnitAndFactors
+from ..sensirion_word_command import I2cChecksumError
+from ..timing import ClockCorrelator, host_time
 from .sfm3019_constants import MeasurementMode, FLOW_UNIT_PREFIX, FLOW_UNIT, FLOW_TIME_BASE
 
 
@@ -22,7 +25,8 @@ class Sfm3019I2cSensorBridgeDevice:
         MeasurementMode.AirO2Mix: Sfm3019I2cCmdStartMeasAirO2Mix,
     }
 
-    def __init__(self, sensor_bridge, sensor_bridge_port, slave_address=0x2E):
+    def __init__(self, sensor_bridge, sensor_bridge_port, slave_address=0x2E,
+                 recovery_policy=None):
         """
         Constructs a new SFM3019 I²C device.
 
@@ -32,6 +36,9 @@ class Sfm3019I2cSensorBridgeDevice:
             The port on the SensorBridge which the sensor is connected to.
         :param byte slave_address:
             The I²C slave address, defaults to 0x2E.
+        :param ~sensirion_sensorbridge_i2c_sfm.error_recovery.RecoveryPolicy recovery_policy:
+            How to recover from communication errors while reading
+            measurements. Defaults to None, i.e. errors are raised directly.
         """
         self._sensor_bridge = sensor_bridge
         self._sensor_bridge_port = sensor_bridge_port
@@ -41,6 +48,21 @@ class Sfm3019I2cSensorBridgeDevice:
         self._flow_offset = None
         self._flow_unit = None
 
+        self._measure_mode = None
+        self._air_o2_mix_fraction_permille = None
+
+        #: The recovery policy (:py:class:`~sensirion_sensorbridge_i2c_sfm.error_recovery.RecoveryPolicy`
+        #: or None) applied when reading measurements.
+        self.recovery_policy = recovery_policy
+        self._recovery_statistics = None
+
+        self._last_transceive_time = None
+
+        self._buffered_handle = None
+        self._buffered_interval = None
+        self._buffered_index = 0
+        self._buffered_clock = None
+
     def _execute(self, command):
         """
         Perform read and write operations of an I²C command.
@@ -61,12 +83,16 @@ class Sfm3019I2cSensorBridgeDevice:
         total_timeout_us = max(command.read_delay, command.timeout) * 1e6
         tx_data = command.tx_data or b""
         rx_length = command.rx_length or 0
+        start_time = host_time()
         response = self._sensor_bridge.transceive_i2c(self._sensor_bridge_port,
                                                       address=self._slave_address,
                                                       tx_data=tx_data,
                                                       rx_length=rx_length,
                                                       timeout_us=total_timeout_us,
                                                       )
+        # The midpoint of the transceive window is the best estimate of when
+        # the I²C transfer took place on the bus.
+        self._last_transceive_time = (start_time + host_time()) / 2.
         return command.interpret_response(response)
 
     def _get_factors_and_unit(self, measure_mode):
@@ -98,6 +124,18 @@ class Sfm3019I2cSensorBridgeDevice:
 
         return "{}{}{}".format(prefix, unit, time)
 
+    @property
+    def recovery_statistics(self):
+        """
+        :return: Counters about errors and recoveries while reading
+                 measurements with a recovery policy.
+        :rtype: ~sensirion_sensorbridge_i2c_sfm.error_recovery.RecoveryStatistics
+        """
+        if self._recovery_statistics is None:
+            from ..error_recovery import RecoveryStatistics
+            self._recovery_statistics = RecoveryStatistics()
+        return self._recovery_statistics
+
     def initialize_sensor(self, measure_mode):
         """
         Stop any running continuous measurement that may execute on the sensor
@@ -132,19 +170,51 @@ class Sfm3019I2cSensorBridgeDevice:
             Fraction (in permille 0-1000) of O2 contained in the Air/O2 Mix.
             This parameter is only used when measure_mode is 'AirO2Mix'.
         """
-        if measure_mode == MeasurementMode.AirO2Mix:
-            cmd = self.MeasurementCmds[measure_mode]
-            return self._execute(cmd(air_o2_mix_fraction_permille))
+        self._measure_mode = measure_mode
+        self._air_o2_mix_fraction_permille = air_o2_mix_fraction_permille
+        return self._execute(self._create_start_command())
 
-        return self._execute(self.MeasurementCmds[measure_mode]())
+    def _create_start_command(self):
+        """Create the start measurement command of the current mode"""
+        cmd = self.MeasurementCmds[self._measure_mode]
+        if self._measure_mode == MeasurementMode.AirO2Mix:
+            return cmd(self._air_o2_mix_fraction_permille)
+        return cmd()
 
     def stop_continuous_measurement(self):
+        self._measure_mode = None
         return self._execute(Sfm3019I2cCmdStopMeas())
 
+    def _restart_continuous_measurement(self):
+        """
+        Re-issue the last start measurement command, keeping the factors, and
+        wait until the first result is available (the sensor does not
+        acknowledge reads before). Returns whether the measurement was
+        restarted, i.e. False if it is not running.
+        """
+        if self._measure_mode is None:
+            return False
+        cmd = self._create_start_command()
+        self._execute(cmd)
+        time.sleep(cmd.read_delay)
+        return True
+
+    def _read_measurement_words(self):
+        """Read the raw measurement, applying the recovery policy (if any)"""
+        if self.recovery_policy is None:
+            return self._execute(Sfm3019I2cCmdReadMeas())
+        return self.recovery_policy.execute(
+            lambda: self._execute(Sfm3019I2cCmdReadMeas()),
+            self._restart_continuous_measurement, self.recovery_statistics)
+
     def read_continuous_measurement(self):
         """
         Read a single measurement from the running measurement
 
+        If a recovery policy is set, communication errors are handled
+        according to it, see
+        :py:class:`~sensirion_sensorbridge_i2c_sfm.error_recovery.RecoveryPolicy`.
+
         :return:
             The measured flow and temperature
 
@@ -155,4 +225,120 @@ class Sfm3019I2cSensorBridgeDevice:
         :rtype:
             tuple
         """
-        return self._convert_measurement_data(self._execute(Sfm3019I2cCmdReadMeas()))
+        return self._convert_measurement_data(self._read_measurement_words())
+
+    def read_timestamped_measurement(self):
+        """
+        Read a single measurement like :py:meth:`read_continuous_measurement`,
+        together with its acquisition time.
+
+        :return:
+            The acquisition time (host time in Seconds, the midpoint of the
+            transceive window, see
+            :py:func:`~sensirion_sensorbridge_i2c_sfm.timing.host_time`), the
+            flow and the temperature (all float).
+        :rtype:
+            tuple
+        """
+        flow, temperature = self.read_continuous_measurement()
+        return self._last_transceive_time, flow, temperature
+
+    def start_buffered_measurement(self, interval):
+        """
+        Let the SensorBridge read the running measurement repeatedly in the
+        given interval and buffer the results, see
+        :py:meth:`read_buffered_measurements`. The continuous measurement
+        must be started before.
+
+        :param float interval:
+            Read interval in Seconds.
+        """
+        command = Sfm3019I2cCmdReadMeas()
+        self._buffered_handle = self._sensor_bridge.start_repeated_i2c_transceive(
+            self._sensor_bridge_port,
+            interval_us=interval * 1e6,
+            address=self._slave_address,
+            tx_data=b"",
+            rx_length=command.rx_length,
+            timeout_us=command.timeout * 1e6,
+        )
+        self._buffered_interval = interval
+        self._buffered_index = 0
+        self._buffered_clock = ClockCorrelator()
+
+    def stop_buffered_measurement(self):
+        """
+        Stop the buffered measurement started with
+        :py:meth:`start_buffered_measurement`.
+        """
+        if self._buffered_handle is not None:
+            self._sensor_bridge.stop_repeated_i2c_transceive(self._buffered_handle)
+            self._last_transceive_time = None
+
+        self._buffered_handle = None
+        self._buffered_interval = None
+        self._buffered_index = 0
+        self._buffered_clock = None
+
+    def read_buffered_measurements(self):
+        """
+        Read all measurements buffered by the SensorBridge since the last call.
+
+        :return:
+            The measurements, each as a tuple of flow and temperature like
+            returned by :py:meth:`read_continuous_measurement`, and the number
+            of lost measurements (due to buffer overrun, I²C errors or wrong
+            checksums).
+        :rtype:
+            tuple(list, int)
+        """
+        measurements, lost = self.read_timestamped_buffered_measurements()
+        return [measurement[1:] for measurement in measurements], lost
+
+    def read_timestamped_buffered_measurements(self):
+        """
+        Read all buffered measurements like
+        :py:meth:`read_buffered_measurements`, together with their
+        acquisition times.
+
+        The acquisition times are derived from the sampling interval of the
+        SensorBridge. The relation between its clock and the host clock is
+        estimated continuously with a
+        :py:class:`~sensirion_sensorbridge_i2c_sfm.timing.ClockCorrelator`,
+        so the timestamps are neither affected by the latency of the serial
+        communication nor by the drift of the SensorBridge clock.
+
+        :return:
+            The measurements, each as a tuple of acquisition time (host time
+            in Seconds), flow and temperature, and the number of lost
+            measurements.
+        :rtype:
+            tuple(list, int)
+        """
+        command = Sfm3019I2cCmdReadMeas()
+        response = self._sensor_bridge.read_buffer(self._buffered_handle)
+        response_time = host_time()
+        lost = response.lost_bytes // (command.rx_length + 1)
+        # Index of the first received value in the sequence of all reads
+        # performed by the SensorBridge.
+        index = self._buffered_index + lost
+        self._buffered_index = index + len(response.values)
+        if response.values:
+            # The last value was certainly read when the response arrived.
+            self._buffered_clock.update(
+                (self._buffered_index - 1) * self._buffered_interval,
+                response_time)
+        measurements = []
+        for i, value in enumerate(response.values, index):
+            if value.error is not None:
+                lost += 1
+                continue
+            try:
+                flow, temperature = self._convert_measurement_data(
+                    command.interpret_response(value.raw_data))
+            except I2cChecksumError:
+                lost += 1
+                continue
+            timestamp = self._buffered_clock.to_host(i * self._buffered_interval)
+            measurements.append((timestamp, flow, temperature))
+        return measurements, lost
@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+# (c) Copyright 2020 Sensirion AG, Switzerland
+
+from __future__ import absolute_import, division, print_function
+import logging
+import threading
+import time
+
+from ..error_recovery import classify_error
+from .device import Sfm3019I2cSensorBridgeDevice
+from .sfm3019_constants import MeasurementMode, SFM3019_DEFAULT_I2C_ADDRESS, \
+    SFM3019_DEFAULT_I2C_FREQUENCY, SFM3019_DEFAULT_VOLTAGE, \
+    SFM3019_PRODUCT_IDENTIFIER
+
+log = logging.getLogger(__name__)
+
+
+def _bring_up_bridge(bridge, ports, addresses, measure_mode, product_ids,
+                     configure_ports, i2c_frequency, supply_voltage,
+                     power_up_delay, device_kwargs):
+    """
+    Probes all ports and addresses of one SensorBridge.
+
+    :return: List of tuples (serial number, device) of the found sensors.
+    :rtype: list
+    """
+    if configure_ports:
+        for port in ports:
+            bridge.set_i2c_frequency(port, frequency=i2c_frequency)
+            bridge.set_supply_voltage(port, voltage=supply_voltage)
+            bridge.switch_supply_on(port)
+        # Wait only once for all sensors of this bridge to power up.
+        time.sleep(power_up_delay)
+
+    found = []
+    for port in ports:
+        # Scanning the bus is a single transaction, while probing an absent
+        # address costs a full I²C timeout.
+        responding = bridge.scan_i2c(port, first_address=min(addresses),
+                                     last_address=max(addresses))
+        for address in addresses:
+            if address not in responding:
+                continue
+            device = Sfm3019I2cSensorBridgeDevice(bridge, port, address,
+                                                  **device_kwargs)
+            try:
+                # A running measurement must be stopped to read the product
+                # identifier. Other commands are only sent to known products.
+                device.stop_continuous_measurement()
+                product_id, serial_number = \
+                    device.read_product_identifier_and_serial_number()
+                if (product_ids is not None) and \
+                        (product_id not in product_ids):
+                    log.info("Ignoring device 0x{:02X} on port {} with "
+                             "unknown product identifier 0x{:08X}."
+                             .format(address, port, product_id))
+                    continue
+                device.initialize_sensor(measure_mode)
+            except Exception as e:
+                if classify_error(e) is None:
+                    raise
+                log.warning("Failed to initialize device 0x{:02X} on port {}: "
+                            "{}".format(address, port, e))
+                continue
+            found.append((serial_number, device))
+    return found
+
+
+def discover_sensors(bridges, ports=None,
+                     addresses=(SFM3019_DEFAULT_I2C_ADDRESS,),
+                     measure_mode=MeasurementMode.Air,
+                     product_ids=(SFM3019_PRODUCT_IDENTIFIER,),
+                     configure_ports=True,
+                     i2c_frequency=SFM3019_DEFAULT_I2C_FREQUENCY,
+                     supply_voltage=SFM3019_DEFAULT_VOLTAGE,
+                     power_up_delay=0.01, **device_kwargs):
+    """
+    Searches for SFM sensors on all given SensorBridges and initializes them.
+
+    The SensorBridges are probed in parallel, one thread per bridge, so the
+    total duration is about the duration of the slowest bridge.
+
+    .. note:: SensorBridges sharing the same serial port are still accessed
+              one after another since the port is locked during each
+              transaction.
+
+    :param list bridges:
+        The :py:class:`~sensirion_shdlc_sensorbridge.device.SensorBridgeShdlcDevice`
+        instances to search.
+    :param list ports:
+        The SensorBridge ports to probe. Defaults to both ports.
+    :param list addresses:
+        The I²C addresses to probe. Defaults to the default address of the
+        SFM3019.
+    :param MeasurementMode measure_mode:
+        The measurement mode to initialize the sensors for.
+    :param list product_ids:
+        Accepted product identifiers, or None to accept every device
+        responding to the "Read Product Identifier" command.
+    :param bool configure_ports:
+        Whether to set the I²C frequency and supply voltage and to switch on
+        the supply of the probed ports. Defaults to True.
+    :param float i2c_frequency:
+        I²C frequency to configure, in Hz.
+    :param float supply_voltage:
+        Supply voltage to configure, in Volts.
+    :param float power_up_delay:
+        Time in Seconds to wait after switching on the supply.
+    :param device_kwargs:
+        Additional keyword arguments passed to
+        :py:class:`~sensirion_sensorbridge_i2c_sfm.sfm3019.device.Sfm3019I2cSensorBridgeDevice`,
+        e.g. ``recovery_policy``.
+    :return:
+        The initialized devices, keyed by their serial number (int).
+    :rtype:
+        dict
+    :raise:
+        The first error which occurred while communicating with a
+        SensorBridge itself, if this happened for all bridges. Errors of
+        single bridges or sensors are only logged, so the sensors of the
+        other bridges are still returned.
+    """
+    if ports is None:
+        from sensirion_shdlc_sensorbridge import SensorBridgePort
+        ports = (SensorBridgePort.ONE, SensorBridgePort.TWO)
+    results = [[] for _ in bridges]
+    errors = []
+
+    def worker(index, bridge):
+        try:
+            results[index] = _bring_up_bridge(
+                bridge, ports, addresses, measure_mode, product_ids,
+                configure_ports, i2c_frequency, supply_voltage,
+                power_up_delay, device_kwargs)
+        except Exception as e:
+            log.error("Failed to search SensorBridge {}: {}".format(index, e))
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=(index, bridge),
+                                name="sfm-discovery-{}".format(index))
+               for index, bridge in enumerate(bridges)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if errors and (len(errors) == len(bridges)):
+        raise errors[0]
+
+    devices = {}
+    for found in results:
+        for serial_number, device in found:
+            if serial_number in devices:
+                log.warning("Ignoring duplicate sensor with serial number {}."
+                            .format(serial_number))
+                continue
+            devices[serial_number] = device
+    return devices
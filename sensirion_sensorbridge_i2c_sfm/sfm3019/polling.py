@@ -0,0 +1,315 @@
+# -*- coding: utf-8 -*-
+# (c) Copyright 2020 Sensirion AG, Switzerland
+
+from __future__ import absolute_import, division, print_function
+from collections import deque
+import math
+import time
+
+from ..timing import host_time
+from .sfm3019_constants import SFM3019_MEASUREMENT_UPDATE_PERIOD
+
+
+class MeasurementPoller(object):
+    """
+    Polls the continuous measurement of a device in step with the update
+    period of the sensor.
+
+    The sensor updates its measurement result periodically. Reading faster
+    returns the same result again (a duplicate), reading slower misses
+    results. The poller detects duplicates and counts skipped results based
+    on an estimate of the update grid (period and phase) of the sensor.
+
+    The grid is fitted (least squares) to the measured update times: if two
+    consecutive reads at most half a period apart return different results,
+    exactly one update took place between them, at their midpoint on
+    average. Results read after a longer time are assigned to the latest
+    update of the grid, so the number of skipped results follows from the
+    grid.
+
+    .. note:: Updates can only be measured if a read takes less than half an
+              update period. Over a SensorBridge, where every read takes
+              about a millisecond, the grid is never established: skipped
+              results are then counted based on the nominal update period
+              and phase locking never waits.
+
+    With phase locking enabled, the poller reads as fast as possible until
+    the measured updates span enough updates to estimate the period. Then it
+    waits until the next update is due before reading, so most new results
+    are read with a single I²C transaction. Since such reads only return a
+    duplicate if the update is late, they are not used for the fit. To keep
+    the grid locked to the sensor, every ``probe_every``-th update is read
+    shortly before it is due instead, which brackets it between a duplicate
+    and a new result. Probes which miss the update read earlier next time.
+
+    A repeated result is only considered a duplicate if it was read within
+    one and a half update periods after the result was read first, since the
+    sensor may measure the same value again, e.g. at zero flow.
+    """
+
+    def __init__(self, device, update_period=SFM3019_MEASUREMENT_UPDATE_PERIOD,
+                 phase_lock=False, margin=0.1, window=64, period_tolerance=0.1,
+                 probe_every=8, clock=None, sleep=None):
+        """
+        Creates a poller for a device with running continuous measurement.
+
+        :param ~sensirion_sensorbridge_i2c_sfm.sfm3019.device.Sfm3019I2cSensorBridgeDevice device:
+            The device to poll.
+        :param float update_period:
+            Nominal update period of the sensor in Seconds.
+        :param bool phase_lock:
+            If True, :py:meth:`poll` waits until the next update is due.
+            Defaults to False.
+        :param float margin:
+            Fraction of the update period to read after (or when probing,
+            before) the predicted update when phase locking. Defaults to 0.1.
+        :param int window:
+            Number of recent measured updates the grid is fitted to. Defaults
+            to 64.
+        :param float period_tolerance:
+            Maximum relative deviation of the estimated update period from
+            the nominal one. Defaults to 0.1.
+        :param int probe_every:
+            Maximum number of updates between two measured updates when phase
+            locking. Defaults to 8.
+        :param callable clock:
+            Function returning the host time in Seconds, in the time base of
+            the device timestamps. Defaults to
+            :py:func:`~sensirion_sensorbridge_i2c_sfm.timing.host_time`.
+        :param callable sleep:
+            Function sleeping for the given time in Seconds. Defaults to
+            :py:func:`time.sleep`.
+        """
+        super(MeasurementPoller, self).__init__()
+        if window < 2:
+            raise ValueError("The window must contain at least 2 updates.")
+        self._device = device
+        self._nominal_period = float(update_period)
+        self._period = float(update_period)
+        self._min_period = self._nominal_period * (1. - period_tolerance)
+        self._max_period = self._nominal_period * (1. + period_tolerance)
+        self._phase_lock = phase_lock
+        self._margin = margin
+        self._probe_every = probe_every
+        self._clock = clock or host_time
+        self._sleep = sleep or time.sleep
+
+        # Measured updates (index, time) to fit the grid to, and the time of
+        # the update with index 0 of the fitted grid.
+        self._measured = deque(maxlen=window)
+        self._refit_interval = max(1, window // 4)
+        self._unfitted = 0
+        self._origin = None
+        self._last_result = None
+        self._last_result_time = None
+        self._last_read_time = None
+        # Whether the last read was timed independently of the predicted
+        # update, i.e. not after it when phase locking.
+        self._last_read_unbiased = True
+        # Time from starting a read until its timestamp.
+        self._read_latency = 0.0
+        self._last_index = None
+        # Whether the index of the last result is exact, i.e. not derived
+        # from the grid.
+        self._last_index_exact = False
+        # Fraction of the update period to probe before the predicted update,
+        # increased as long as probes miss the update.
+        self._probe_lead = margin
+
+        #: Number of reads (int).
+        self.reads = 0
+        #: Number of reads (int) which returned an already read result.
+        self.duplicates = 0
+        #: Estimated number of results (int) which were missed.
+        self.skipped = 0
+
+    @property
+    def update_period(self):
+        """
+        :return: The estimated update period of the sensor in Seconds.
+        :rtype: float
+        """
+        return self._period
+
+    @property
+    def next_update_time(self):
+        """
+        :return: The predicted host time of the next update, or None if
+                 unknown yet.
+        :rtype: float/None
+        """
+        if self._last_index is None:
+            return None
+        return self._update_time(self._last_index + 1)
+
+    def _update_time(self, index):
+        return self._origin + index * self._period
+
+    def _latest_index(self, timestamp):
+        return int(math.floor((timestamp - self._origin) / self._period))
+
+    def _established(self):
+        # The measured updates span enough updates to estimate the period.
+        return bool(self._measured) and \
+            self._measured[-1][0] - self._measured[0][0] >= \
+            self._refit_interval
+
+    def _probing(self):
+        return self._last_index - self._measured[-1][0] >= self._probe_every
+
+    def wait_for_next_update(self):
+        """
+        Sleeps until the next update of the sensor is due (plus the margin),
+        or shortly before it when probing. If it is overdue already, returns
+        immediately.
+        """
+        if self._last_index is None or not self._established():
+            # Read right away until the grid is established.
+            return
+        if not self._probing():
+            margin = self._margin
+        elif self._probe_lead < 1.:
+            margin = -self._probe_lead
+        else:
+            # The grid is lost, read right away to bracket the next update.
+            return
+        delay = self.next_update_time + self._period * margin - \
+            self._read_latency - self._clock()
+        if delay > 0:
+            self._sleep(delay)
+
+    def _fit(self):
+        """Fit the update grid to the measured updates"""
+        points = self._measured
+        if not self._established():
+            # Too short to estimate the period, align the grid to the latest
+            # update only.
+            index, update_time = points[-1]
+            self._origin = update_time - index * self._period
+            return
+        # Relative to the first point to preserve the precision.
+        index0, time0 = points[0]
+        mean_index = sum(i - index0 for i, _ in points) / len(points)
+        mean_time = sum(t - time0 for _, t in points) / len(points)
+        covariance = variance = 0.0
+        for index, update_time in points:
+            di = index - index0 - mean_index
+            covariance += di * (update_time - time0 - mean_time)
+            variance += di * di
+        self._period = min(max(covariance / variance, self._min_period),
+                           self._max_period)
+        self._origin = time0 + mean_time - \
+            (index0 + mean_index) * self._period
+
+    def _measure_update(self, index, update_time):
+        established = self._established()
+        self._measured.append((index, update_time))
+        self._unfitted += 1
+        if not established or self._unfitted >= self._refit_interval:
+            self._unfitted = 0
+            self._fit()
+
+    def poll(self):
+        """
+        Reads the measurement once (after waiting for the next update when
+        phase locking) and checks whether it is a new result.
+
+        :return:
+            The acquisition time, flow and temperature (all float) of a new
+            result, or None for a duplicate.
+        :rtype:
+            tuple/None
+        """
+        unbiased = True
+        if self._phase_lock:
+            # Reads after the predicted update only return a duplicate if
+            # the update is late, such brackets would bias the grid.
+            unbiased = (self._last_index is None) or \
+                (not self._established()) or self._probing()
+            self.wait_for_next_update()
+        start_time = self._clock()
+        timestamp, flow, temperature = \
+            self._device.read_timestamped_measurement()
+        self._read_latency = max(timestamp - start_time, 0.0)
+        self.reads += 1
+        result = (flow, temperature)
+        previous_read_time = self._last_read_time
+        previous_read_unbiased = self._last_read_unbiased
+        self._last_read_time = timestamp
+        self._last_read_unbiased = unbiased
+
+        if self._last_index is None:
+            # The update took place up to a period earlier, the grid is
+            # corrected by the first measured update.
+            self._last_result = result
+            self._last_result_time = timestamp
+            self._last_index = 0
+            self._last_index_exact = True
+            self._origin = timestamp
+            return timestamp, flow, temperature
+
+        if result == self._last_result:
+            # The sensor may measure the same value again, but only once an
+            # update is clearly overdue.
+            if timestamp - self._last_result_time < 1.5 * self._period:
+                self.duplicates += 1
+                return None
+            index = self._latest_index(timestamp)
+            exact = False
+        elif timestamp - previous_read_time <= self._period / 2.:
+            # Exactly one update took place since the previous read.
+            update_time = (previous_read_time + timestamp) / 2.
+            if self._last_index_exact:
+                index = self._last_index + 1
+            elif self._established():
+                index = int(round((update_time - self._origin) /
+                                  self._period))
+            else:
+                # The grid is not established yet, start over from this
+                # update to keep the measured updates consistent.
+                index = self._last_index + 1
+                self._measured.clear()
+            if previous_read_unbiased:
+                self._measure_update(index, update_time)
+                self._probe_lead = max(self._probe_lead / 2., self._margin)
+            exact = True
+        else:
+            if timestamp - previous_read_time < self._min_period:
+                # Still exactly one update, but not precisely timed.
+                index = self._last_index + 1
+                exact = self._last_index_exact
+            else:
+                index = self._latest_index(timestamp)
+                exact = False
+            if self._phase_lock and self._established() and \
+                    self._probing():
+                # The update took place before the probe, the grid is late.
+                self._probe_lead = min(2. * self._probe_lead, 1.)
+        index = max(index, self._last_index + 1)
+        self.skipped += index - self._last_index - 1
+        self._last_result = result
+        self._last_result_time = timestamp
+        self._last_index = index
+        self._last_index_exact = exact
+        return timestamp, flow, temperature
+
+    def read_new_measurement(self, timeout=None):
+        """
+        Polls until a new result is available.
+
+        :param float timeout:
+            Maximum time to wait in Seconds, or None (the default) for no
+            limit.
+        :return:
+            The acquisition time, flow and temperature (all float), or None
+            if the timeout elapsed.
+        :rtype:
+            tuple/None
+        """
+        end_time = None if timeout is None else self._clock() + timeout
+        while True:
+            sample = self.poll()
+            if sample is not None:
+                return sample
+            if (end_time is not None) and (self._clock() >= end_time):
+                return None
@@ -9,6 +9,9 @@ class MeasurementMode(Enum):
 
 SFM3019_DEFAULT_I2C_FREQUENCY = 400e3
 SFM3019_DEFAULT_VOLTAGE = 3.3
+SFM3019_DEFAULT_I2C_ADDRESS = 0x2E
+SFM3019_PRODUCT_IDENTIFIER = 0x04020611
+SFM3019_MEASUREMENT_UPDATE_PERIOD = 0.0005
 
 FLOW_UNIT_PREFIX = {
     3: 'n',
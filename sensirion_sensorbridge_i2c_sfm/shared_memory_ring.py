@@ -0,0 +1,333 @@
+# -*- coding: utf-8 -*-
+# (c) Copyright 2020 Sensirion AG, Switzerland
+
+from __future__ import absolute_import, division, print_function
+from struct import Struct
+import os
+import sys
+import time
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:  # Python < 3.8
+    shared_memory = None
+
+#: Header of the shared memory block: magic, layout version, capacity (number
+#: of slots), the sequence number of the last published sample and the
+#: identity of the resource tracker of the publisher.
+_HEADER = Struct("<4sIIxxxxQQ")
+#: Offset of the sequence number within the header.
+_HEADER_SEQUENCE_OFFSET = 16
+#: One slot of the ring: sequence number, timestamp, flow and temperature.
+_SLOT = Struct("<Qddd")
+_SEQUENCE = Struct("<Q")
+
+_MAGIC = b"SFMR"
+_LAYOUT_VERSION = 2
+
+
+def _require_shared_memory():
+    if shared_memory is None:
+        raise RuntimeError("multiprocessing.shared_memory is not available, "
+                           "Python 3.8 or newer is required.")
+
+
+def _resource_tracker_id():
+    """
+    Identity of the resource tracker used by this process, i.e. the inode of
+    the pipe to it, which is shared with all child processes. 0 if unknown.
+    """
+    try:
+        from multiprocessing import resource_tracker
+        fd = resource_tracker._resource_tracker._fd
+        return os.fstat(fd).st_ino if fd is not None else 0
+    except (ImportError, AttributeError, TypeError, OSError):
+        return 0
+
+
+class SampleRingPublisher(object):
+    """
+    Publishes measurements of a device into a ring buffer in shared memory,
+    so that any number of other processes can consume the same live stream
+    with :py:class:`SampleRingSubscriber`.
+
+    Every sample gets a sequence number (starting at 1) which allows the
+    subscribers to detect new and lost samples. The publisher never waits
+    for subscribers: slow subscribers simply lose the oldest samples.
+
+    .. note:: Only one publisher per ring is allowed.
+    """
+
+    def __init__(self, device, name=None, capacity=4096):
+        """
+        Creates a new ring buffer in shared memory.
+
+        :param ~sensirion_sensorbridge_i2c_sfm.sfm3019.device.Sfm3019I2cSensorBridgeDevice device:
+            The device to read the measurements from. The device needs to be
+            initialized and the continuous measurement must be started.
+        :param str name:
+            The name of the shared memory block. If None (the default), a
+            unique name is generated. See :py:attr:`name`.
+        :param int capacity:
+            Number of samples the ring can hold. Defaults to 4096.
+        """
+        _require_shared_memory()
+        if capacity < 1:
+            raise ValueError("Capacity must be at least 1.")
+        self._device = device
+        self._capacity = int(capacity)
+        self._shm = shared_memory.SharedMemory(
+            name=name, create=True,
+            size=_HEADER.size + self._capacity * _SLOT.size)
+        self._buffer = self._shm.buf
+        self._sequence = 0
+        _HEADER.pack_into(self._buffer, 0, _MAGIC, _LAYOUT_VERSION,
+                          self._capacity, self._sequence,
+                          _resource_tracker_id())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+        self.unlink()
+
+    @property
+    def name(self):
+        """
+        :return: The name of the shared memory block, to be passed to
+                 :py:class:`SampleRingSubscriber`.
+        :rtype: str
+        """
+        return self._shm.name
+
+    @property
+    def capacity(self):
+        """
+        :return: Number of samples the ring can hold.
+        :rtype: int
+        """
+        return self._capacity
+
+    @property
+    def sequence(self):
+        """
+        :return: Sequence number of the last published sample (0 if no
+                 sample was published yet).
+        :rtype: int
+        """
+        return self._sequence
+
+    def publish(self, timestamp, flow, temperature):
+        """
+        Writes a sample into the ring.
+
+        :param float timestamp: Acquisition time of the sample, see
+                                :py:mod:`~sensirion_sensorbridge_i2c_sfm.timing`.
+        :param float flow: The measured flow.
+        :param float temperature: The measured temperature.
+        :return: The sequence number of the published sample.
+        :rtype: int
+        """
+        sequence = self._sequence + 1
+        offset = _HEADER.size + ((sequence - 1) % self._capacity) * _SLOT.size
+        # Invalidate the slot first so readers never accept a half-written
+        # sample, then write the payload and finally the sequence number.
+        _SEQUENCE.pack_into(self._buffer, offset, 0)
+        _SLOT.pack_into(self._buffer, offset, 0, timestamp, flow, temperature)
+        _SEQUENCE.pack_into(self._buffer, offset, sequence)
+        _SEQUENCE.pack_into(self._buffer, _HEADER_SEQUENCE_OFFSET, sequence)
+        self._sequence = sequence
+        return sequence
+
+    def publish_measurement(self):
+        """
+        Reads one measurement from the device and publishes it.
+
+        :return: The sequence number of the published sample.
+        :rtype: int
+        """
+        return self.publish(*self._device.read_timestamped_measurement())
+
+    def run(self, interval=0.0, count=None, stop_event=None):
+        """
+        Continuously reads measurements from the device and publishes them.
+
+        :param float interval:
+            Minimum time in Seconds between two reads. Defaults to 0.0, i.e.
+            reading as fast as possible.
+        :param int count:
+            Number of samples to publish, or None (the default) to run until
+            ``stop_event`` is set.
+        :param threading.Event/multiprocessing.Event stop_event:
+            Optional event to stop the acquisition.
+        """
+        published = 0
+        next_read = time.time()
+        while (count is None) or (published < count):
+            if (stop_event is not None) and stop_event.is_set():
+                break
+            delay = next_read - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            next_read += interval
+            self.publish_measurement()
+            published += 1
+
+    def close(self):
+        """
+        Closes the access to the shared memory of this process.
+        """
+        self._buffer = None
+        self._shm.close()
+
+    def unlink(self):
+        """
+        Destroys the shared memory block. Call it once all subscribers are
+        closed.
+        """
+        self._shm.unlink()
+
+
+class SampleRingSubscriber(object):
+    """
+    Reads the samples published by a :py:class:`SampleRingPublisher`,
+    possibly from another process. Reading never blocks the publisher.
+    """
+
+    def __init__(self, name, start_at_latest=True):
+        """
+        Attaches to an existing ring buffer.
+
+        :param str name:
+            The name of the shared memory block, see
+            :py:attr:`SampleRingPublisher.name`.
+        :param bool start_at_latest:
+            If True (the default), only samples published after attaching are
+            returned. If False, all samples still contained in the ring are
+            returned by the first read.
+        """
+        _require_shared_memory()
+        if sys.version_info >= (3, 13):
+            self._shm = shared_memory.SharedMemory(name=name, track=False)
+        else:
+            self._shm = shared_memory.SharedMemory(name=name)
+        self._buffer = self._shm.buf
+        magic, version, capacity, sequence, tracker_id = \
+            _HEADER.unpack_from(self._buffer)
+        if sys.version_info < (3, 13) and \
+                (tracker_id == 0 or tracker_id != _resource_tracker_id()):
+            self._untrack()
+        if magic != _MAGIC or version != _LAYOUT_VERSION:
+            self._shm.close()
+            raise ValueError("Shared memory '{}' does not contain a sample "
+                             "ring.".format(name))
+        self._capacity = capacity
+        self._last_sequence = sequence if start_at_latest else \
+            max(0, sequence - capacity)
+
+        #: Number of samples (int) which were overwritten by the publisher
+        #: before this subscriber could read them.
+        self.lost_samples = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __iter__(self):
+        """
+        Endlessly yields new samples, polling the ring every millisecond when
+        no new samples are available.
+        """
+        while True:
+            samples = self.read_new()
+            if not samples:
+                time.sleep(0.001)
+            for sample in samples:
+                yield sample
+
+    def _untrack(self):
+        # Until Python 3.13, attaching registers the block at the resource
+        # tracker, which would destroy it when this process exits. This is
+        # only done if the publisher uses another tracker, since a shared
+        # tracker (e.g. in a child process of the publisher) keeps a single
+        # registration, which must be kept for the publisher.
+        try:
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(self._shm._name, "shared_memory")
+        except (ImportError, AttributeError):
+            pass
+
+    @property
+    def sequence(self):
+        """
+        :return: Sequence number of the last sample published to the ring.
+        :rtype: int
+        """
+        return _SEQUENCE.unpack_from(self._buffer,
+                                     _HEADER_SEQUENCE_OFFSET)[0]
+
+    def read_new(self, max_samples=None):
+        """
+        Returns all samples published since the last call.
+
+        :param int max_samples:
+            Maximum number of samples to return, or None (the default) for
+            no limit. Remaining samples are returned by the next call.
+        :return:
+            The new samples, each as a tuple of sequence number (int),
+            timestamp, flow and temperature (all float).
+        :rtype:
+            list(tuple)
+        """
+        buf = self._buffer
+        capacity = self._capacity
+        latest = _SEQUENCE.unpack_from(buf, _HEADER_SEQUENCE_OFFSET)[0]
+        if latest - self._last_sequence > capacity:
+            self.lost_samples += latest - self._last_sequence - capacity
+            self._last_sequence = latest - capacity
+        if max_samples is not None:
+            latest = min(latest, self._last_sequence + max_samples)
+        samples = []
+        for sequence in range(self._last_sequence + 1, latest + 1):
+            offset = _HEADER.size + ((sequence - 1) % capacity) * _SLOT.size
+            sample = _SLOT.unpack_from(buf, offset)
+            if sample[0] != sequence or \
+                    _SEQUENCE.unpack_from(buf, offset)[0] != sequence:
+                # Overwritten (or being overwritten) in the meantime.
+                self.lost_samples += 1
+                continue
+            samples.append(sample)
+        self._last_sequence = latest
+        return samples
+
+    def read_latest(self):
+        """
+        Returns the most recently published sample without affecting
+        :py:meth:`read_new`.
+
+        :return:
+            The latest sample as a tuple of sequence number (int), timestamp,
+            flow and temperature (all float), or None if there is none.
+        :rtype:
+            tuple/None
+        """
+        buf = self._buffer
+        sequence = _SEQUENCE.unpack_from(buf, _HEADER_SEQUENCE_OFFSET)[0]
+        if sequence == 0:
+            return None
+        offset = _HEADER.size + ((sequence - 1) % self._capacity) * _SLOT.size
+        sample = _SLOT.unpack_from(buf, offset)
+        if sample[0] != sequence or \
+                _SEQUENCE.unpack_from(buf, offset)[0] != sequence:
+            return None
+        return sample
+
+    def close(self):
+        """
+        Detaches from the shared memory block.
+        """
+        self._buffer = None
+        self._shm.close()
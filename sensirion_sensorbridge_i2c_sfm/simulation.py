@@ -0,0 +1,224 @@
+# -*- coding: utf-8 -*-
+# (c) Copyright 2020 Sensirion AG, Switzerland
+
+"""
+Simulated SensorBridge with SFM3019 sensors, to run and compare acquisition
+setups without hardware.
+"""
+
+from __future__ import absolute_import, division, print_function
+from struct import pack, unpack
+import math
+import time
+
+from .sfm3019.sfm3019_constants import SFM3019_DEFAULT_I2C_ADDRESS, \
+    SFM3019_MEASUREMENT_UPDATE_PERIOD, SFM3019_PRODUCT_IDENTIFIER
+
+_FLOW_SCALE_FACTOR = 170
+_FLOW_OFFSET = -24576
+_FLOW_UNIT = 0x0148  # slm at 20 °C
+
+
+def _crc(data):
+    # Own implementation rather than CrcCalculator, to not distort profiles
+    # of the acquisition stack.
+    crc = 0xFF
+    for value in data:
+        crc ^= value
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x31 if crc & 0x80 else crc << 1) & 0xFF
+    return crc
+
+
+def _encode_words(words):
+    data = bytearray()
+    for word in words:
+        raw = bytearray(pack(">H", word & 0xFFFF))
+        data.extend(raw)
+        data.append(_crc(raw))
+    return bytes(data)
+
+
+class SimulatedSfm3019(object):
+    """
+    A simulated SFM3019 sensor measuring a sinusoidal flow. Flows outside of
+    the range of the sensor saturate.
+    """
+
+    def __init__(self, serial_number, amplitude=50.0, offset=60.0,
+                 frequency=0.5,
+                 update_period=SFM3019_MEASUREMENT_UPDATE_PERIOD):
+        """
+        :param int serial_number: The serial number of the sensor.
+        :param float amplitude: Amplitude of the flow in slm.
+        :param float offset: Mean flow in slm.
+        :param float frequency: Frequency of the flow in Hz.
+        :param float update_period: Update period of the measurement.
+        """
+        super(SimulatedSfm3019, self).__init__()
+        self.serial_number = serial_number
+        self.amplitude = amplitude
+        self.offset = offset
+        self.frequency = frequency
+        self.update_period = update_period
+        #: Whether the continuous measurement is running (bool).
+        self.measuring = False
+
+    def measurement_words(self, timestamp):
+        """
+        :param float timestamp: The time to get the measurement for.
+        :return: The raw flow and temperature words of the last update
+                 before the given time.
+        :rtype: tuple
+        """
+        timestamp -= timestamp % self.update_period
+        flow = self.offset + self.amplitude * math.sin(
+            2 * math.pi * self.frequency * timestamp)
+        temperature = 25.0 + 0.5 * math.sin(0.01 * timestamp)
+        raw_flow = int(round(flow * _FLOW_SCALE_FACTOR + _FLOW_OFFSET))
+        return (min(max(raw_flow, -0x8000), 0x7FFF),
+                int(round(temperature * 200)))
+
+    def transceive(self, tx_data, rx_length):
+        """
+        Handles one I²C transceive operation.
+
+        :param bytes tx_data: The written bytes.
+        :param int rx_length: Number of bytes to read.
+        :return: The read bytes, or None to not acknowledge.
+        :rtype: bytes/None
+        """
+        command = unpack(">H", tx_data[:2])[0] if len(tx_data) >= 2 else None
+        if command is None:
+            if not self.measuring:
+                return None
+            words = self.measurement_words(time.time())
+        elif command == 0x3FF9:  # Stop measurement
+            self.measuring = False
+            words = []
+        elif command in (0x3603, 0x3608, 0x3632):  # Start measurement
+            self.measuring = True
+            words = []
+        elif self.measuring:
+            return None
+        elif command == 0x3661:  # Get unit and factors
+            words = [_FLOW_SCALE_FACTOR, _FLOW_OFFSET, _FLOW_UNIT]
+        elif command == 0xE102:  # Product identifier and serial number
+            words = [SFM3019_PRODUCT_IDENTIFIER >> 16,
+                     SFM3019_PRODUCT_IDENTIFIER & 0xFFFF] + \
+                [(self.serial_number >> shift) & 0xFFFF
+                 for shift in (48, 32, 16, 0)]
+        else:
+            return None
+        return _encode_words(words)[:rx_length]
+
+
+class _RepeatedTransceive(object):
+    def __init__(self, port, address, interval, tx_data, rx_length):
+        self.port = port
+        self.address = address
+        self.interval = interval
+        self.tx_data = tx_data
+        self.rx_length = rx_length
+        self.start_time = time.time()
+        self.read_count = 0
+
+
+class SimulatedSensorBridge(object):
+    """
+    Simulates the I²C interface of a
+    :py:class:`~sensirion_shdlc_sensorbridge.device.SensorBridgeShdlcDevice`
+    with an SFM3019 connected to each port.
+    """
+
+    def __init__(self, latency=0.0, serial_number=0):
+        """
+        :param float latency:
+            Simulated round trip time in Seconds of every SensorBridge
+            command, e.g. 0.001 for a typical serial connection.
+        :param int serial_number:
+            Base of the serial numbers of the simulated sensors.
+        """
+        super(SimulatedSensorBridge, self).__init__()
+        self.latency = latency
+        #: The simulated sensors (dict), keyed by (port, I²C address).
+        self.sensors = {}
+        for port in (0, 1):
+            self.sensors[(port, SFM3019_DEFAULT_I2C_ADDRESS)] = \
+                SimulatedSfm3019(serial_number + port)
+        self._repeated_transceives = {}
+        self._next_handle = 0
+
+    def _delay(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def set_i2c_frequency(self, port, frequency):
+        self._delay()
+
+    def set_supply_voltage(self, port, voltage):
+        self._delay()
+
+    def switch_supply_on(self, port):
+        self._delay()
+
+    def switch_supply_off(self, port):
+        self._delay()
+
+    def scan_i2c(self, port, first_address=1, last_address=127):
+        self._delay()
+        return sorted(address for (p, address) in self.sensors
+                      if p == int(port) and
+                      first_address <= address <= last_address)
+
+    def transceive_i2c(self, port, address, tx_data, rx_length, timeout_us):
+        self._delay()
+        sensor = self.sensors.get((int(port), address))
+        rx_data = None if sensor is None else \
+            sensor.transceive(bytes(bytearray(tx_data)), rx_length)
+        if rx_data is None:
+            from sensirion_shdlc_sensorbridge.device_errors import \
+                SensorBridgeI2cNackError
+            raise SensorBridgeI2cNackError()
+        return rx_data
+
+    def start_repeated_i2c_transceive(self, port, interval_us, address,
+                                      tx_data, rx_length, timeout_us,
+                                      read_delay_us=0):
+        from sensirion_shdlc_sensorbridge.types import \
+            RepeatedTransceiveHandle
+        self._delay()
+        raw_handle = self._next_handle
+        self._next_handle += 1
+        self._repeated_transceives[raw_handle] = _RepeatedTransceive(
+            int(port), address, interval_us * 1e-6, bytes(bytearray(tx_data)),
+            rx_length)
+        return RepeatedTransceiveHandle(raw_handle, rx_length)
+
+    def stop_repeated_i2c_transceive(self, handle=None):
+        self._delay()
+        if handle is None:
+            self._repeated_transceives.clear()
+        else:
+            self._repeated_transceives.pop(handle.raw_handle, None)
+
+    def read_buffer(self, handle, max_reads=100):
+        from sensirion_shdlc_sensorbridge.types import ReadBufferResponse
+        self._delay()
+        transceive = self._repeated_transceives[handle.raw_handle]
+        sensor = self.sensors.get((transceive.port, transceive.address))
+        count = int((time.time() - transceive.start_time) /
+                    transceive.interval) + 1
+        rx_data = bytearray()
+        for index in range(transceive.read_count, count):
+            timestamp = transceive.start_time + index * transceive.interval
+            words = None if sensor is None or not sensor.measuring else \
+                sensor.measurement_words(timestamp)
+            if words is None:
+                rx_data.append(0x01)  # NACK
+                rx_data.extend(b"\x00" * transceive.rx_length)
+            else:
+                rx_data.append(0x00)
+                rx_data.extend(_encode_words(words)[:transceive.rx_length])
+        transceive.read_count = count
+        return ReadBufferResponse(transceive.rx_length, 0, 0, bytes(rx_data))
@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+# (c) Copyright 2020 Sensirion AG, Switzerland
+
+"""
+Timestamping of samples and alignment of multiple sensor streams.
+
+All timestamps are host times in Seconds as returned by :py:func:`host_time`.
+"""
+
+from __future__ import absolute_import, division, print_function
+from collections import deque
+import time
+
+#: The clock used for all host timestamps (Seconds since the epoch).
+host_time = time.time
+
+
+class ClockCorrelator(object):
+    """
+    Online estimator of the relation between a SensorBridge clock and the
+    host clock, i.e. of the offset and drift in
+    ``host_time = bridge_time + offset + drift * bridge_time``.
+
+    Each observation pairs a bridge time with a host time at which the event
+    had certainly happened already, e.g. the time when the response reporting
+    it was received. Since such an observation can only be late (by the
+    communication latency) but never early, the estimator follows the lower
+    envelope of the observed offsets. Only the earliest observation of each
+    segment of ``segment`` Seconds is kept, so the window covers a fixed time
+    span independent of the observation rate. The minimum offsets of the
+    older and of the newer half of the window define a line, which rejects
+    latency jitter and still tracks the clock drift.
+    """
+
+    def __init__(self, window=64, segment=1.0, min_drift_span=10.0,
+                 max_drift=1e-3):
+        """
+        Creates an estimator without observations.
+
+        :param int window:
+            Number of recent segments taken into account. Defaults to 64.
+        :param float segment:
+            Duration of a segment in Seconds (bridge time). Defaults to 1
+            Second, i.e. the window covers about a minute.
+        :param float min_drift_span:
+            Minimum time span in Seconds covered by the observations before
+            the drift is estimated. Over shorter spans, the latency jitter
+            dominates the drift. Defaults to 10 Seconds.
+        :param float max_drift:
+            Maximum plausible drift between the clocks. Defaults to 1e-3
+            (1000 ppm), far beyond the tolerance of a crystal oscillator.
+        """
+        super(ClockCorrelator, self).__init__()
+        if window < 2:
+            raise ValueError("The window must contain at least 2 entries.")
+        # Earliest observation (bridge time, offset) of each segment, and the
+        # start of the newest segment.
+        self._segments = deque(maxlen=window)
+        self._segment = segment
+        self._segment_start = None
+        self._min_drift_span = min_drift_span
+        self._max_drift = max_drift
+        self._offset = None
+        self._drift = 0.0
+
+    @property
+    def offset(self):
+        """
+        :return: Estimated clock offset in Seconds, or None if there are no
+                 observations yet.
+        :rtype: float/None
+        """
+        return self._offset
+
+    @property
+    def drift(self):
+        """
+        :return: Estimated relative drift of the host clock against the
+                 bridge clock (e.g. 1e-5 for 10 ppm).
+        :rtype: float
+        """
+        return self._drift
+
+    def update(self, bridge_time, host_time):
+        """
+        Adds an observation and updates the estimation.
+
+        :param float bridge_time: Time of the event in bridge time.
+        :param float host_time: Host time when the event had certainly
+                                happened, i.e. never before the event.
+        """
+        offset = host_time - bridge_time
+        if self._segment_start is None or \
+                bridge_time - self._segment_start >= self._segment:
+            self._segment_start = bridge_time
+            self._segments.append((bridge_time, offset))
+        elif offset < self._segments[-1][1]:
+            self._segments[-1] = (bridge_time, offset)
+        segments = list(self._segments)
+        if segments[-1][0] - segments[0][0] < self._min_drift_span:
+            self._drift = 0.0
+            self._offset = min(offset for _, offset in segments)
+            return
+        half = len(segments) // 2
+        b0, o0 = min(segments[:half], key=lambda o: o[1])
+        b1, o1 = min(segments[half:], key=lambda o: o[1])
+        drift = (o1 - o0) / (b1 - b0) if b1 != b0 else 0.0
+        self._drift = max(-self._max_drift, min(self._max_drift, drift))
+        self._offset = o0 - self._drift * b0
+
+    def to_host(self, bridge_time):
+        """
+        Converts a bridge time to host time.
+
+        :param float bridge_time: The bridge time.
+        :return: The estimated host time.
+        :rtype: float
+        """
+        if self._offset is None:
+            raise ValueError("No observations available.")
+        return bridge_time + self._offset + self._drift * bridge_time
+
+
+def _import_numpy(purpose):
+    """Import NumPy, which is only required by some features"""
+    try:
+        import numpy
+    except ImportError:
+        raise ImportError("NumPy is required for {}, install it with "
+                          "'pip install numpy'.".format(purpose))
+    return numpy
+
+
+def common_time_grid(timestamps, interval):
+    """
+    Creates an equidistant time grid covering the time span where all
+    streams have samples.
+
+    :param list timestamps:
+        The timestamps (array-like, ascending) of each stream.
+    :param float interval:
+        The grid interval in Seconds.
+    :return:
+        The grid timestamps.
+    :rtype:
+        numpy.ndarray
+    """
+    numpy = _import_numpy("resampling")
+    start = max(numpy.asarray(t)[0] for t in timestamps)
+    stop = min(numpy.asarray(t)[-1] for t in timestamps)
+    if stop < start:
+        return numpy.empty(0)
+    return start + numpy.arange(int((stop - start) / interval) + 1) * interval
+
+
+def resample(streams, grid):
+    """
+    Resamples multiple sensor streams onto a common time grid by linear
+    interpolation.
+
+    :param list streams:
+        One tuple (timestamps, values) per stream, both array-like with the
+        timestamps in ascending order. Values may be 2-dimensional (samples
+        in rows, e.g. flow and temperature in columns).
+    :param array-like grid:
+        The timestamps to resample to, e.g. from :py:func:`common_time_grid`.
+    :return:
+        One array per stream with the values at the grid timestamps. Grid
+        points outside the time span of a stream are NaN.
+    :rtype:
+        list(numpy.ndarray)
+    """
+    numpy = _import_numpy("resampling")
+    grid = numpy.asarray(grid, dtype=float)
+    results = []
+    for timestamps, values in streams:
+        timestamps = numpy.asarray(timestamps, dtype=float)
+        values = numpy.asarray(values, dtype=float)
+        if len(timestamps) < 2:
+            raise ValueError("Each stream needs at least 2 samples.")
+        # Position of each grid point between two samples, shared by all
+        # columns of the stream.
+        upper = numpy.clip(numpy.searchsorted(timestamps, grid), 1,
+                           len(timestamps) - 1)
+        lower = upper - 1
+        span = timestamps[upper] - timestamps[lower]
+        weight = numpy.divide(grid - timestamps[lower], span,
+                              out=numpy.zeros_like(grid), where=span > 0)
+        if values.ndim > 1:
+            weight = weight[:, numpy.newaxis]
+        result = values[lower] + (values[upper] - values[lower]) * weight
+        outside = (grid < timestamps[0]) | (grid > timestamps[-1])
+        result[outside] = numpy.nan
+        results.append(result)
+    return results
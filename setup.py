@@ -39,9 +39,16 @@ setup(
         'enum34;python_version<"3.4"',
         'sensirion-shdlc-sensorbridge~=0.1.1',
     ],
+    entry_points={
+        'console_scripts': [
+            'sfm-capture=sensirion_sensorbridge_i2c_sfm.capture:main',
+            'sfm-sample-server=sensirion_sensorbridge_i2c_sfm.sample_server:main',
+        ],
+    },
     extras_require={
         'test': [
             'flake8~=3.9.2',
+            'hypothesis~=6.31.6',
             'pytest~=6.2.5',
             'pytest-cov~=3.0.0',
             'mock~=3.0.0',
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+# (c) Copyright 2020 Sensirion AG, Switzerland
+
+from __future__ import absolute_import, division, print_function
+import pytest
+
+from sensirion_sensorbridge_i2c_sfm import capture
+from sensirion_sensorbridge_i2c_sfm.capture import CaptureStatistics, \
+    _BinaryWriter, _NumpyWriter, read_capture_file
+
+
+def records(start, count):
+    return [(i % 2, 1000.0 + i, float(i), 25.0)
+            for i in range(start, start + count)]
+
+
+@pytest.mark.parametrize("count", [0, 5, 70000])
+def test_numpy_writer(tmpdir, count):
+    pytest.importorskip("numpy")
+    path = str(tmpdir.join("capture.npy"))
+    writer = _NumpyWriter(path)
+    for start in range(0, count, 1000):
+        writer.write(records(start, min(1000, count - start)))
+    writer.close()
+    data = read_capture_file(path)
+    assert len(data) == count
+    assert [tuple(r) for r in data[:5]] == records(0, min(5, count))
+    if count:
+        assert tuple(data[-1]) == records(count - 1, 1)[0]
+    assert tmpdir.listdir() == [tmpdir.join("capture.npy")]
+
+
+def test_binary_writer(tmpdir):
+    path = str(tmpdir.join("capture.bin"))
+    writer = _BinaryWriter(path)
+    writer.write(records(0, 3))
+    writer.close()
+    assert read_capture_file(path) == records(0, 3)
+
+
+def test_summary_rate():
+    statistics = CaptureStatistics()
+    statistics.start_time -= 2.0
+    statistics.add_read(0.001, 1000)
+    statistics.report()
+    # The summary right after a report shows the overall rate.
+    summary = statistics.summary()
+    assert "1000 samples" in summary
+    rate = float(summary.split(" Hz")[0].split()[-1])
+    assert 400 < rate <= 500
+
+
+def test_no_file_left_if_setup_fails(tmpdir, monkeypatch):
+    pytest.importorskip("numpy")
+
+    def create_devices(bridge, args):
+        raise IOError("Sensor not found")
+
+    monkeypatch.setattr(capture, "create_devices", create_devices)
+    with pytest.raises(IOError):
+        capture.main(["--simulate", "-o", str(tmpdir.join("capture.npy"))])
+    assert tmpdir.listdir() == []
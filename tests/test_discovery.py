@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+# (c) Copyright 2020 Sensirion AG, Switzerland
+
+from __future__ import absolute_import, division, print_function
+import pytest
+
+pytest.importorskip("sensirion_shdlc_sensorbridge")
+
+from sensirion_shdlc_driver.errors import ShdlcTimeoutError  # noqa: E402
+from sensirion_sensorbridge_i2c_sfm.sfm3019 import \
+    discover_sensors  # noqa: E402
+from sensirion_sensorbridge_i2c_sfm.simulation import SimulatedSfm3019, \
+    SimulatedSensorBridge  # noqa: E402
+
+OTHER_PRODUCT_ADDRESS = 0x40
+
+
+class OtherProduct(SimulatedSfm3019):
+    """Another product with the same product identifier command"""
+
+    def __init__(self):
+        super(OtherProduct, self).__init__(99)
+        self.commands = []
+
+    def transceive(self, tx_data, rx_length):
+        self.commands.append(tx_data[:2])
+        if tx_data[:2] == b"\xE1\x02":
+            rx_data = super(OtherProduct, self).transceive(tx_data, rx_length)
+            # Replace the product identifier (including the CRCs).
+            return b"\x12\x34\x37\x56\x78\x7D" + rx_data[6:]
+        return super(OtherProduct, self).transceive(tx_data, rx_length)
+
+
+class DeadBridge(SimulatedSensorBridge):
+    def scan_i2c(self, port, first_address=1, last_address=127):
+        raise ShdlcTimeoutError()
+
+
+def test_discover_sensors():
+    bridges = [SimulatedSensorBridge(serial_number=10),
+               SimulatedSensorBridge(serial_number=20)]
+    devices = discover_sensors(bridges, power_up_delay=0)
+    assert sorted(devices) == [10, 11, 20, 21]
+    for device in devices.values():
+        assert device.flow_unit is not None
+
+
+def test_ignore_other_products():
+    bridge = SimulatedSensorBridge(serial_number=10)
+    other = OtherProduct()
+    bridge.sensors[(0, OTHER_PRODUCT_ADDRESS)] = other
+    devices = discover_sensors([bridge], power_up_delay=0,
+                               addresses=[0x2E, OTHER_PRODUCT_ADDRESS])
+    assert sorted(devices) == [10, 11]
+    # Only the stop and product identifier commands were sent.
+    assert other.commands == [b"\x3F\xF9", b"\xE1\x02"]
+
+
+def test_keep_sensors_of_healthy_bridges():
+    bridges = [DeadBridge(serial_number=10),
+               SimulatedSensorBridge(serial_number=20)]
+    assert sorted(discover_sensors(bridges, power_up_delay=0)) == [20, 21]
+
+
+def test_all_bridges_failing():
+    with pytest.raises(ShdlcTimeoutError):
+        discover_sensors([DeadBridge(), DeadBridge()], power_up_delay=0)
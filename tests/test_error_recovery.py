@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+# (c) Copyright 2020 Sensirion AG, Switzerland
+
+from __future__ import absolute_import, division, print_function
+import time
+import pytest
+
+pytest.importorskip("sensirion_shdlc_sensorbridge")
+
+from sensirion_shdlc_driver.errors import ShdlcChecksumError, \
+    ShdlcTimeoutError  # noqa: E402
+from sensirion_shdlc_sensorbridge import SensorBridgePort  # noqa: E402
+from sensirion_shdlc_sensorbridge.device_errors import \
+    SensorBridgeI2cNackError, SensorBridgeI2cTimeoutError  # noqa: E402
+from sensirion_sensorbridge_i2c_sfm.error_recovery import ERROR_CHECKSUM, \
+    ERROR_COMMUNICATION, ERROR_BRIDGE_TIMEOUT, ERROR_I2C_TIMEOUT, ERROR_NACK, \
+    RecoveryPolicy, classify_error  # noqa: E402
+from sensirion_sensorbridge_i2c_sfm.sensirion_word_command import \
+    I2cChecksumError  # noqa: E402
+from sensirion_sensorbridge_i2c_sfm.sfm3019 import MeasurementMode, \
+    Sfm3019I2cSensorBridgeDevice  # noqa: E402
+from sensirion_sensorbridge_i2c_sfm.simulation import \
+    SimulatedSfm3019  # noqa: E402
+
+WARM_UP = 0.012
+
+ERRORS = {
+    ERROR_NACK: SensorBridgeI2cNackError,
+    ERROR_I2C_TIMEOUT: SensorBridgeI2cTimeoutError,
+    ERROR_BRIDGE_TIMEOUT: ShdlcTimeoutError,
+    ERROR_COMMUNICATION: ShdlcChecksumError,
+}
+
+
+class FaultyBridge(object):
+    """
+    SensorBridge with a simulated SFM3019 which does not acknowledge reads
+    during the warm-up after starting the measurement, and with injectable
+    errors of measurement reads.
+    """
+
+    def __init__(self):
+        self.sensor = SimulatedSfm3019(0)
+        self.started = None
+        self.starts = 0
+        #: Errors (category) of the next measurement reads.
+        self.faults = []
+
+    def transceive_i2c(self, port, address, tx_data, rx_length, timeout_us):
+        rx_data = self.sensor.transceive(bytes(tx_data), rx_length)
+        if tx_data:
+            if bytes(tx_data[:2]) == b"\x36\x08":  # Start measurement
+                self.started = time.time()
+                self.starts += 1
+        else:
+            if self.faults:
+                category = self.faults.pop(0)
+                if category == ERROR_CHECKSUM:
+                    return rx_data[:2] + bytes(bytearray([rx_data[2] ^ 1])) + \
+                        rx_data[3:]
+                raise ERRORS[category]()
+            if self.started is not None and \
+                    time.time() - self.started < WARM_UP:
+                rx_data = None
+        if rx_data is None:
+            raise SensorBridgeI2cNackError()
+        return rx_data
+
+    def reset_sensor(self):
+        self.sensor.measuring = False
+
+
+@pytest.fixture
+def bridge():
+    return FaultyBridge()
+
+
+@pytest.fixture
+def device(bridge):
+    device = Sfm3019I2cSensorBridgeDevice(bridge, SensorBridgePort.ONE,
+                                          recovery_policy=RecoveryPolicy())
+    device.initialize_sensor(MeasurementMode.Air)
+    device.start_continuous_measurement(MeasurementMode.Air)
+    time.sleep(WARM_UP)
+    return device
+
+
+@pytest.mark.parametrize("category", sorted(ERRORS) + [ERROR_CHECKSUM])
+def test_transient_error_is_retried(bridge, device, category):
+    bridge.faults = [category]
+    device.read_continuous_measurement()
+    statistics = device.recovery_statistics
+    assert statistics.errors[category] == 1
+    assert statistics.total_errors == 1
+    assert (statistics.retries, statistics.recovered, statistics.failures) == \
+        (1, 1, 0)
+    assert statistics.restarts == (1 if category == ERROR_NACK else 0)
+
+
+def test_classify_unknown_error():
+    assert classify_error(ValueError()) is None
+
+
+def test_recover_from_sensor_reset(bridge, device):
+    bridge.reset_sensor()
+    device.read_continuous_measurement()
+    statistics = device.recovery_statistics
+    # A single restart, waiting for the warm-up instead of restarting again.
+    assert (statistics.restarts, statistics.recovered) == (1, 1)
+    assert statistics.errors[ERROR_NACK] == 1
+    assert bridge.starts == 2
+
+
+def test_consecutive_errors_restart_once(bridge, device):
+    bridge.faults = [ERROR_I2C_TIMEOUT] * 3
+    device.read_continuous_measurement()
+    statistics = device.recovery_statistics
+    assert (statistics.retries, statistics.restarts) == (3, 1)
+
+
+def test_failure_after_max_retries(bridge, device):
+    bridge.faults = [ERROR_BRIDGE_TIMEOUT] * 4
+    with pytest.raises(ShdlcTimeoutError):
+        device.read_continuous_measurement()
+    assert device.recovery_statistics.failures == 1
+
+
+def test_not_recoverable(bridge, device):
+    device.recovery_policy = RecoveryPolicy(recoverable=[ERROR_NACK])
+    bridge.faults = [ERROR_CHECKSUM]
+    with pytest.raises(I2cChecksumError):
+        device.read_continuous_measurement()
+    assert device.recovery_statistics.retries == 0
+
+
+def test_no_restart_without_running_measurement(bridge, device):
+    device.stop_continuous_measurement()
+    with pytest.raises(SensorBridgeI2cNackError):
+        device.read_continuous_measurement()
+    statistics = device.recovery_statistics
+    assert (statistics.restarts, statistics.failures) == (0, 1)
+    assert bridge.starts == 1
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+# (c) Copyright 2020 Sensirion AG, Switzerland
+
+from __future__ import absolute_import, division, print_function
+import subprocess
+import sys
+from pytest import mark
+
+# Cumulative import time budgets in Microseconds of the package itself (i.e.
+# without the Python startup), about 1.5 times the time measured on a
+# typical machine so that regressions are detected.
+IMPORT_TIME_BUDGETS_US = {
+    "import sensirion_sensorbridge_i2c_sfm": 6000,
+    "import sensirion_sensorbridge_i2c_sfm.sfm3019.device": 22000,
+}
+
+# Modules of optional subsystems which must not be loaded by plain imports.
+HEAVY_MODULES = [
+    'json',
+    'numpy',
+    'socket',
+    'multiprocessing.shared_memory',
+    'sensirion_shdlc_driver',
+    'sensirion_sensorbridge_i2c_sfm.sample_server',
+    'sensirion_sensorbridge_i2c_sfm.shared_memory_ring',
+]
+
+pytestmark = mark.skipif(sys.version_info < (3, 7),
+                         reason="Requires PEP 562 and -X importtime")
+
+
+def _run_python(code, *options):
+    process = subprocess.Popen([sys.executable] + list(options) + ['-c', code],
+                               stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    stdout, stderr = process.communicate()
+    assert process.returncode == 0, stderr.decode()
+    return stdout.decode(), stderr.decode()
+
+
+def _import_time_us(statement):
+    _, stderr = _run_python(statement, '-X', 'importtime')
+    total_us = 0
+    for line in stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        # Only count top level imports to not count nested imports twice.
+        if name.strip().startswith('sensirion_sensorbridge_i2c_sfm') and \
+                not name.startswith('  '):
+            total_us += int(cumulative)
+    return total_us
+
+
+@mark.parametrize("statement", sorted(IMPORT_TIME_BUDGETS_US))
+def test_import_time_budget(statement):
+    """Tests if importing the package stays within the time budget."""
+    # Modules imported lazily (importlib) get no line of their own, so the
+    # modules are imported explicitly. The best of some runs is taken to
+    # reduce the noise.
+    total_us = min(_import_time_us(statement) for _ in range(3))
+    assert 0 < total_us < IMPORT_TIME_BUDGETS_US[statement]
+
+
+def test_optional_subsystems_not_imported():
+    """Tests if optional subsystems are only imported on first use."""
+    stdout, _ = _run_python(
+        "import sys\n"
+        "from sensirion_sensorbridge_i2c_sfm.sfm3019 import "
+        "Sfm3019I2cSensorBridgeDevice, MeasurementMode\n"
+        "print('\\n'.join(sys.modules))")
+    loaded = set(stdout.splitlines())
+    assert [module for module in HEAVY_MODULES if module in loaded] == []
+
+
+def test_lazy_attributes():
+    """Tests if lazy attributes are resolved on first access."""
+    import sensirion_sensorbridge_i2c_sfm as package
+    from sensirion_sensorbridge_i2c_sfm.sample_server import SampleServer
+    assert package.SampleServer is SampleServer
+    assert 'SampleServer' in dir(package)
+
+
+def test_star_import():
+    """Tests if the star import provides the public API of the package."""
+    stdout, _ = _run_python(
+        "from sensirion_sensorbridge_i2c_sfm.sfm3019 import *\n"
+        "print(Sfm3019I2cSensorBridgeDevice.__name__, MeasurementMode.Air)")
+    assert stdout.split() == ['Sfm3019I2cSensorBridgeDevice',
+                              'MeasurementMode.Air']
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+# (c) Copyright 2020 Sensirion AG, Switzerland
+
+from __future__ import absolute_import, division, print_function
+import math
+import pytest
+
+from sensirion_sensorbridge_i2c_sfm.sfm3019.polling import MeasurementPoller
+
+NOMINAL_PERIOD = 0.0005
+READ_DURATION = 0.0001
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, delay):
+        self.now += delay
+
+
+class GridDevice(object):
+    """
+    Device whose sensor updates every ``period`` Seconds, returning the index
+    of the update as flow. Every read takes ``read_duration`` Seconds and is
+    timestamped at its midpoint.
+    """
+
+    def __init__(self, clock, period, phase=0.37,
+                 read_duration=READ_DURATION):
+        self.clock = clock
+        self.period = period
+        self.read_duration = read_duration
+        self.start = clock.now - phase * period
+        self.flows = []
+
+    def read_timestamped_measurement(self):
+        timestamp = self.clock.now + self.read_duration / 2
+        self.clock.now += self.read_duration
+        flow = float(math.floor((timestamp - self.start) / self.period))
+        self.flows.append(flow)
+        return timestamp, flow, 25.0
+
+
+def run(period, phase_lock, duration=1.0, read_delay=0.0, warm_up=0.0):
+    clock = FakeClock()
+    device = GridDevice(clock, period)
+    poller = MeasurementPoller(device, NOMINAL_PERIOD, phase_lock=phase_lock,
+                               clock=clock, sleep=clock.sleep)
+    flows = []
+    start_time = clock.now
+    while clock.now < start_time + warm_up + duration:
+        sample = poller.read_new_measurement()
+        flows.append(sample[1])
+        if clock.now >= start_time + warm_up:
+            clock.sleep(read_delay)
+    missed = sum(int(b - a) - 1 for a, b in zip(flows, flows[1:]))
+    return poller, device, flows, missed
+
+
+@pytest.mark.parametrize("period", [0.000485, 0.0005, 0.000515])
+@pytest.mark.parametrize("phase_lock", [False, True])
+def test_period_and_skipped(period, phase_lock):
+    poller, device, flows, missed = run(period, phase_lock)
+    assert abs(poller.update_period - period) < 0.001 * period
+    assert poller.skipped == missed
+    assert poller.duplicates == len(device.flows) - len(flows)
+    if phase_lock:
+        # Mostly a single read per update.
+        assert missed == 0
+        assert len(device.flows) < 1.2 * len(flows)
+
+
+@pytest.mark.parametrize("period", [0.000485, 0.000515])
+def test_slow_consumer(period):
+    # Reading every 1.5 updates skips every third update, which is counted
+    # based on the grid learned while reading fast.
+    poller, device, flows, missed = run(period, False, read_delay=1.5 * period,
+                                        warm_up=0.05)
+    assert missed > 500
+    assert poller.skipped == missed
+
+
+@pytest.mark.parametrize("phase_lock", [False, True])
+def test_slow_reads(phase_lock):
+    # Over a SensorBridge, a read takes about 1 ms, i.e. longer than half an
+    # update period, so no update can be measured.
+    clock = FakeClock()
+    device = GridDevice(clock, NOMINAL_PERIOD, read_duration=0.00105)
+    sleeps = []
+    poller = MeasurementPoller(device, phase_lock=phase_lock, clock=clock,
+                               sleep=sleeps.append)
+    flows = [poller.read_new_measurement()[1] for _ in range(1000)]
+    missed = sum(int(b - a) - 1 for a, b in zip(flows, flows[1:]))
+    assert missed > 1000
+    # The skipped results follow from the nominal period, and phase locking
+    # never waits.
+    assert abs(poller.skipped - missed) <= 1
+    assert poller.duplicates == 0
+    assert poller.update_period == NOMINAL_PERIOD
+    assert sleeps == []
+
+
+def test_repeated_value():
+    clock = FakeClock()
+    # Zero flow, the result never changes.
+    device = GridDevice(clock, 1e6)
+    poller = MeasurementPoller(device, clock=clock, sleep=clock.sleep)
+    assert poller.poll() is not None
+    clock.sleep(NOMINAL_PERIOD)
+    assert poller.poll() is None
+    # An unchanged result is new again once an update is clearly overdue.
+    clock.sleep(NOMINAL_PERIOD)
+    assert poller.poll() is not None
+    assert poller.duplicates == 1
+
+
+def test_invalid_window():
+    with pytest.raises(ValueError):
+        MeasurementPoller(None, window=1)
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+# (c) Copyright 2020 Sensirion AG, Switzerland
+
+from __future__ import absolute_import, division, print_function
+import subprocess
+import sys
+import pytest
+
+pytest.importorskip("sensirion_shdlc_sensorbridge")
+
+from sensirion_shdlc_sensorbridge import SensorBridgePort  # noqa: E402
+from sensirion_sensorbridge_i2c_sfm.crc_calculator import \
+    CrcCalculator  # noqa: E402
+from sensirion_sensorbridge_i2c_sfm.profiling import STAGES, \
+    AcquisitionProfiler  # noqa: E402
+from sensirion_sensorbridge_i2c_sfm.sfm3019 import MeasurementMode, \
+    Sfm3019I2cSensorBridgeDevice  # noqa: E402
+from sensirion_sensorbridge_i2c_sfm.simulation import \
+    SimulatedSensorBridge, SimulatedSfm3019  # noqa: E402
+
+
+@pytest.fixture
+def device():
+    device = Sfm3019I2cSensorBridgeDevice(SimulatedSensorBridge(),
+                                          SensorBridgePort.ONE)
+    device.initialize_sensor(MeasurementMode.Air)
+    device.start_continuous_measurement(MeasurementMode.Air)
+    yield device
+    device.stop_continuous_measurement()
+
+
+@pytest.mark.parametrize("trace_allocations", [False, True])
+def test_profile_simulated_acquisition(device, trace_allocations):
+    with AcquisitionProfiler(sample_every=2,
+                             trace_allocations=trace_allocations) as profiler:
+        for _ in range(10):
+            flow, temperature = device.read_continuous_measurement()
+    assert (profiler.reads, profiler.profiled_reads) == (10, 5)
+    assert profiler.samples == 5
+    assert profiler.stages["crc"].calls == 10
+    assert profiler.stages["bridge"].calls == 5
+    assert profiler.stages["interpret_response"].calls == 5
+    report = profiler.report()
+    assert all(stage in report for stage in STAGES)
+    assert (profiler.stages["bridge"].peak_bytes > 0) == \
+        trace_allocations
+
+
+def test_profiler_restores_stack():
+    call = CrcCalculator.__dict__["__call__"]
+    read = Sfm3019I2cSensorBridgeDevice.__dict__["read_continuous_measurement"]
+    with AcquisitionProfiler():
+        assert CrcCalculator.__dict__["__call__"] is not call
+    assert CrcCalculator.__dict__["__call__"] is call
+    assert Sfm3019I2cSensorBridgeDevice.__dict__[
+        "read_continuous_measurement"] is read
+
+
+def test_tracemalloc_imported_on_demand():
+    process = subprocess.Popen(
+        [sys.executable, "-c", "import sys\n"
+         "import sensirion_sensorbridge_i2c_sfm.capture\n"
+         "print('tracemalloc' in sys.modules)"],
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    stdout, stderr = process.communicate()
+    assert process.returncode == 0, stderr.decode()
+    assert stdout.decode().strip() == "False"
+
+
+@pytest.mark.parametrize("amplitude", [50.0, 1000.0])
+def test_simulated_flow_in_sensor_range(amplitude):
+    sensor = SimulatedSfm3019(0, amplitude=amplitude)
+    flows = [(sensor.measurement_words(t * 0.01)[0] + 24576) / 170.
+             for t in range(200)]
+    assert -48.2 < min(flows) and max(flows) < 337.4
+    if amplitude == 50.0:
+        assert min(flows) == pytest.approx(10.0, abs=0.1)
+        assert max(flows) == pytest.approx(110.0, abs=0.1)
+
+
+def test_simulated_repeated_transceive_handles_are_unique():
+    bridge = SimulatedSensorBridge()
+    first = bridge.start_repeated_i2c_transceive(0, 1000, 0x2E, b"", 6, 0)
+    second = bridge.start_repeated_i2c_transceive(1, 1000, 0x2E, b"", 6, 0)
+    bridge.stop_repeated_i2c_transceive(first)
+    third = bridge.start_repeated_i2c_transceive(0, 1000, 0x2E, b"", 6, 0)
+    assert third.raw_handle not in (first.raw_handle, second.raw_handle)
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+# (c) Copyright 2020 Sensirion AG, Switzerland
+
+from __future__ import absolute_import, division, print_function
+import gc
+import os
+import socket
+import threading
+import time
+import warnings
+import pytest
+
+from sensirion_sensorbridge_i2c_sfm.sample_server import FRAME_HEADER, \
+    FRAME_MAGIC, FRAME_TYPE_SAMPLES, SampleClient, SampleServer, encode_frame
+
+unix_sockets = pytest.mark.skipif(not hasattr(socket, "AF_UNIX"),
+                                  reason="Requires Unix sockets")
+
+
+class CountingDevice(object):
+    """Device returning consecutive numbers as flow"""
+
+    flow_unit = "sl/min"
+
+    def __init__(self, offset=0.0):
+        self.offset = offset
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def read_timestamped_measurement(self):
+        with self.lock:
+            self.count += 1
+            return time.time(), self.offset + self.count, 25.0
+
+
+@pytest.fixture
+def server():
+    server = SampleServer([CountingDevice(), CountingDevice(1000.0)],
+                          ("127.0.0.1", 0), interval=0.0005, batch_size=8)
+    server.start()
+    yield server
+    server.close()
+
+
+def test_encode_frame():
+    frame = encode_frame(FRAME_TYPE_SAMPLES, 3, b"abc")
+    assert FRAME_HEADER.unpack(frame[:FRAME_HEADER.size]) == \
+        (FRAME_MAGIC, FRAME_TYPE_SAMPLES, 3, 3)
+    assert frame[FRAME_HEADER.size:] == b"abc"
+
+
+def test_stream_samples(server):
+    with SampleClient(server.address, timeout=5) as client:
+        assert [c["flow_unit"] for c in client.channels] == ["sl/min"] * 2
+        device = client.device(1)
+        assert device.flow_unit == "sl/min"
+        timestamp, flow, temperature = device.read_timestamped_measurement()
+        assert abs(timestamp - time.time()) < 1.0
+        assert flow > 1000.0 and temperature == 25.0
+        # Samples of a channel arrive in order without gaps.
+        previous = device.read_continuous_measurement()[0]
+        for _ in range(50):
+            flow = device.read_continuous_measurement()[0]
+            assert flow == previous + 1
+            previous = flow
+        assert client.lost_samples == [0, 0]
+
+
+def test_late_clients_lose_no_samples(server):
+    time.sleep(0.2)
+    for _ in range(20):
+        # The info frame must always be received first, even while the
+        # server is streaming.
+        with SampleClient(server.address, timeout=5) as client:
+            for _ in range(3):
+                client.read_samples()
+            assert client.lost_samples == [0, 0]
+
+
+@unix_sockets
+def test_unix_socket(tmpdir):
+    path = str(tmpdir.join("sfm.sock"))
+    with SampleServer([CountingDevice()], path, interval=0.001):
+        with SampleClient(path, timeout=5) as client:
+            channel, samples = client.read_samples()
+            assert channel == 0 and samples
+    assert not os.path.exists(path)
+
+
+@unix_sockets
+def test_unix_socket_keeps_other_files(tmpdir):
+    path = tmpdir.join("data.txt")
+    path.write("important")
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter("always")
+        with pytest.raises((IOError, OSError)):
+            SampleServer([CountingDevice()], str(path))
+        gc.collect()
+    assert path.read() == "important"
+    # The socket was closed.
+    assert not [w for w in caught if "unclosed" in str(w.message)]
+
+
+class FailingDevice(CountingDevice):
+    def read_timestamped_measurement(self):
+        if self.count >= 3:
+            raise IOError("Sensor disconnected")
+        return super(FailingDevice, self).read_timestamped_measurement()
+
+
+def test_serve_forever_raises_acquisition_error():
+    server = SampleServer([FailingDevice()], ("127.0.0.1", 0))
+    try:
+        with pytest.raises(IOError, match="disconnected"):
+            server.serve_forever()
+    finally:
+        server.close()
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+# (c) Copyright 2020 Sensirion AG, Switzerland
+
+from __future__ import absolute_import, division, print_function
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import pytest
+
+pytest.importorskip("multiprocessing.shared_memory")
+
+import sensirion_sensorbridge_i2c_sfm  # noqa: E402
+from sensirion_sensorbridge_i2c_sfm.shared_memory_ring import \
+    SampleRingPublisher, SampleRingSubscriber  # noqa: E402
+
+CROSS_PROCESS_SCRIPT = """
+import json
+import multiprocessing
+import subprocess
+import sys
+from sensirion_sensorbridge_i2c_sfm.shared_memory_ring import \\
+    SampleRingPublisher, SampleRingSubscriber
+
+
+def subscribe(name, attached, published, results):
+    with SampleRingSubscriber(name, start_at_latest=False) as subscriber:
+        attached.set()
+        published.wait()
+        samples = subscriber.read_new()
+        results.put(([s[0] for s in samples], [s[2] for s in samples],
+                     subscriber.lost_samples))
+
+
+if __name__ == "__main__":
+    context = multiprocessing.get_context(sys.argv[1])
+    publisher = SampleRingPublisher(None, capacity=8)
+    for i in range(5):
+        publisher.publish(i, float(i), 25.0)
+    attached, published = context.Event(), context.Event()
+    results = context.Queue()
+    process = context.Process(target=subscribe, args=(
+        publisher.name, attached, published, results))
+    process.start()
+    attached.wait()
+    for i in range(5, 20):
+        publisher.publish(i, float(i), 25.0)
+    published.set()
+    result = list(results.get(timeout=60))
+    process.join()
+    # An unrelated process attaching must not destroy the ring either.
+    subprocess.check_call([sys.executable, "-c",
+        "from sensirion_sensorbridge_i2c_sfm.shared_memory_ring import "
+        "SampleRingSubscriber; SampleRingSubscriber({!r}).close()"
+        .format(publisher.name)])
+    with SampleRingSubscriber(publisher.name) as subscriber:
+        result.append(subscriber.sequence)
+    publisher.close()
+    publisher.unlink()
+    print(json.dumps(result))
+"""
+
+
+@pytest.mark.parametrize("start_method", ["fork", "spawn"])
+def test_cross_process(tmpdir, start_method):
+    if start_method not in multiprocessing.get_all_start_methods():
+        pytest.skip("Start method not supported")
+    script = tmpdir.join("ring.py")
+    script.write(CROSS_PROCESS_SCRIPT)
+    # Make the package importable in the script and its child processes.
+    root = os.path.dirname(os.path.dirname(
+        os.path.abspath(sensirion_sensorbridge_i2c_sfm.__file__)))
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(
+        [root] + [p for p in [env.get("PYTHONPATH")] if p])
+    process = subprocess.Popen([sys.executable, str(script), start_method],
+                               stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                               env=env)
+    stdout, stderr = process.communicate(timeout=120)
+    assert process.returncode == 0, stderr.decode()
+    # The resource tracker complains about unknown or leaked segments.
+    assert b"resource_tracker" not in stderr, stderr.decode()
+    sequences, flows, lost, sequence = json.loads(stdout.decode())
+    # The ring holds the last 8 of 20 samples, the first 12 were lost.
+    assert sequences == list(range(13, 21))
+    assert flows == [float(i) for i in range(12, 20)]
+    assert lost == 12
+    assert sequence == 20
+
+
+def test_read_new_and_latest():
+    with SampleRingPublisher(None, capacity=4) as publisher:
+        with SampleRingSubscriber(publisher.name) as subscriber:
+            assert subscriber.read_latest() is None
+            assert subscriber.read_new() == []
+            for i in range(3):
+                assert publisher.publish(i, i * 10., 25.) == i + 1
+            assert subscriber.read_new(max_samples=2) == \
+                [(1, 0., 0., 25.), (2, 1., 10., 25.)]
+            assert subscriber.read_latest() == (3, 2., 20., 25.)
+            for i in range(3, 10):
+                publisher.publish(i, i * 10., 25.)
+            # Samples 3 to 6 were overwritten before being read.
+            assert [s[0] for s in subscriber.read_new()] == [7, 8, 9, 10]
+            assert subscriber.lost_samples == 4
+            assert subscriber.sequence == publisher.sequence == 10
@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+# (c) Copyright 2020 Sensirion AG, Switzerland
+
+from __future__ import absolute_import, division, print_function
+from struct import pack
+import random
+import pytest
+
+from sensirion_sensorbridge_i2c_sfm.crc_calculator import CrcCalculator
+from sensirion_sensorbridge_i2c_sfm.timing import ClockCorrelator, \
+    common_time_grid, resample
+
+INTERVAL = 0.002
+POLL_INTERVAL = 0.05
+DRIFT = 50e-6
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class LatencyBridge(object):
+    """
+    Buffers a measurement every interval of its own clock, which drifts
+    against the host clock, and answers with a random latency.
+    """
+
+    def __init__(self, clock, drift=DRIFT, latency=(0.001, 0.004)):
+        from sensirion_sensorbridge_i2c_sfm.simulation import SimulatedSfm3019
+        self.clock = clock
+        self.drift = drift
+        self.latency = latency
+        self.sensor = SimulatedSfm3019(0)
+        self.random = random.Random(42)
+        crc = CrcCalculator(8, 0x31, 0xFF)
+        words = [pack(">H", word) for word in (0x6000, 0x1388)]
+        self.frame = b"\x00" + b"".join(w + bytes(bytearray([crc(w)]))
+                                        for w in words)
+
+    def transceive_i2c(self, port, address, tx_data, rx_length, timeout_us):
+        return self.sensor.transceive(bytes(tx_data), rx_length)
+
+    def start_repeated_i2c_transceive(self, port, interval_us, address,
+                                      tx_data, rx_length, timeout_us):
+        from sensirion_shdlc_sensorbridge.types import \
+            RepeatedTransceiveHandle
+        self.interval = interval_us * 1e-6
+        self.start_time = self.clock.now
+        self.read_count = 0
+        return RepeatedTransceiveHandle(0, rx_length)
+
+    def sample_time(self, index):
+        """True host time of a buffered read"""
+        return self.start_time + index * self.interval * (1. + self.drift)
+
+    def read_buffer(self, handle):
+        from sensirion_shdlc_sensorbridge.types import ReadBufferResponse
+        latency = self.random.uniform(*self.latency)
+        arrival = self.clock.now + latency * self.random.uniform(0.2, 0.8)
+        count = int((arrival - self.start_time) /
+                    (self.interval * (1. + self.drift))) + 1
+        data = self.frame * (count - self.read_count)
+        self.read_count = count
+        self.clock.now += latency
+        return ReadBufferResponse(handle.rx_length, 0, 0, data)
+
+
+def test_clock_correlator_rejects_latency_and_tracks_drift():
+    rng = random.Random(1)
+    correlator = ClockCorrelator()
+    offset = 123.0
+    bridge_time = 0.0
+    while bridge_time < 60.:
+        bridge_time += rng.uniform(0.04, 0.06)
+        host_time = offset + bridge_time * (1. + DRIFT)
+        correlator.update(bridge_time, host_time + rng.uniform(0.001, 0.004))
+    assert correlator.drift == pytest.approx(DRIFT, abs=5e-6)
+    # Late by about the minimum latency, but never early.
+    error = correlator.to_host(bridge_time) - \
+        (offset + bridge_time * (1. + DRIFT))
+    assert 0.0 < error < 0.0013
+
+
+def test_buffered_timestamps_under_latency_and_drift(monkeypatch):
+    sensirion_shdlc_sensorbridge = \
+        pytest.importorskip("sensirion_shdlc_sensorbridge")
+    from sensirion_sensorbridge_i2c_sfm.sfm3019 import device as device_module
+    clock = FakeClock()
+    monkeypatch.setattr(device_module, "host_time", clock)
+    bridge = LatencyBridge(clock)
+    device = device_module.Sfm3019I2cSensorBridgeDevice(
+        bridge, sensirion_shdlc_sensorbridge.SensorBridgePort.ONE)
+    device.initialize_sensor(device_module.MeasurementMode.Air)
+    device.start_buffered_measurement(INTERVAL)
+    errors = []
+    index = 0
+    while clock.now - bridge.start_time < 40.:
+        clock.now += POLL_INTERVAL
+        measurements, lost = device.read_timestamped_buffered_measurements()
+        assert lost == 0
+        for timestamp, flow, temperature in measurements:
+            if clock.now - bridge.start_time > 20.:
+                errors.append(timestamp - bridge.sample_time(index))
+            index += 1
+    assert device._buffered_clock.drift == pytest.approx(DRIFT, abs=10e-6)
+    # Timestamps are never early, and late by at most the minimum latency
+    # instead of jittering with the latency.
+    assert min(errors) > -0.0002
+    assert max(errors) < 0.001
+    assert max(errors) - min(errors) < 0.0005
+
+
+def test_common_time_grid():
+    numpy = pytest.importorskip("numpy")
+    grid = common_time_grid([[0.0, 1.0, 2.0], [0.5, 1.5, 2.5]], 0.25)
+    numpy.testing.assert_allclose(grid, [0.5, 0.75, 1.0, 1.25, 1.5, 1.75, 2.0])
+    assert len(common_time_grid([[0.0, 1.0], [2.0, 3.0]], 0.1)) == 0
+
+
+def test_resample():
+    numpy = pytest.importorskip("numpy")
+    flow, values = resample([
+        ([0.0, 1.0, 2.0], [0.0, 10.0, 0.0]),
+        ([0.5, 2.5], [[1.0, 20.0], [3.0, 22.0]]),
+    ], [0.0, 0.5, 1.5, 2.5])
+    numpy.testing.assert_allclose(flow, [0.0, 5.0, 5.0, numpy.nan])
+    numpy.testing.assert_allclose(values, [[numpy.nan, numpy.nan],
+                                           [1.0, 20.0], [2.0, 21.0],
+                                           [3.0, 22.0]])
+    with pytest.raises(ValueError):
+        resample([([0.0], [1.0])], [0.0])
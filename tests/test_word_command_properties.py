@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+# (c) Copyright 2020 Sensirion AG, Switzerland
+
+"""
+Property-based tests comparing the word command codec bit for bit against
+the reference implementations below, which are frozen copies of the original
+code. Any optimized implementation must pass these tests unchanged.
+"""
+
+from __future__ import absolute_import, division, print_function
+from struct import pack
+import pytest
+
+from sensirion_sensorbridge_i2c_sfm.crc_calculator import CrcCalculator
+from sensirion_sensorbridge_i2c_sfm.sensirion_word_command import \
+    I2cChecksumError, SensirionWordI2cCommand
+from sensirion_sensorbridge_i2c_sfm.sfm3019.commands import int16, \
+    Sfm3019I2cCmdGetUnitAndFactors, Sfm3019I2cCmdReadMeas, \
+    Sfm3019I2cCmdReadProductIdentifierAndSerialNumber
+
+hypothesis = pytest.importorskip("hypothesis")
+from hypothesis import given, strategies as st  # noqa: E402
+
+
+def reference_crc(width, polynomial, init_value, final_xor, data):
+    crc = init_value
+    for value in data:
+        crc ^= value
+        for i in range(width):
+            if crc & (1 << (width - 1)):
+                crc = (crc << 1) ^ polynomial
+            else:
+                crc = crc << 1
+            crc &= (1 << width) - 1
+    return crc ^ final_xor
+
+
+def reference_build_tx_data(command, command_bytes, tx_words, crc):
+    if (command is None) and (tx_words is None):
+        return None
+    command_pack_format = {
+        1: ">B",
+        2: ">H",
+    }
+    data = bytearray(pack(command_pack_format[command_bytes], command)
+                     if command is not None else b"")
+    for word in tx_words or []:
+        raw_data = bytearray(pack(">H", word))
+        data.extend(raw_data)
+        if crc is not None:
+            data.append(crc(raw_data))
+    return data
+
+
+def reference_interpret_response(crc, data):
+    data = bytearray(data)
+    words = []
+    bytes_per_word = 3 if crc is not None else 2
+    for i in range(len(data)):
+        if i % bytes_per_word == 0:
+            next_word = data[i] << 8
+        elif i % bytes_per_word == 1:
+            next_word += data[i]
+            words.append(next_word)
+        else:
+            received_crc = data[i]
+            expected_crc = crc(data[i-2:i])
+            if received_crc != expected_crc:
+                raise I2cChecksumError(received_crc, expected_crc, data)
+    return words if len(words) > 0 else None
+
+
+def outcome(function, *args):
+    """Returns the result of a call, or the details of the raised error."""
+    try:
+        return "result", function(*args)
+    except I2cChecksumError as e:
+        return ("error", type(e), e.received_checksum, e.expected_checksum,
+                bytes(e.received_data), e.error_message)
+
+
+words = st.lists(st.integers(0, 0xFFFF), max_size=20)
+crc8_params = st.tuples(st.integers(0, 0xFF), st.integers(0, 0xFF),
+                        st.integers(0, 0xFF))
+
+
+@st.composite
+def crc_params(draw):
+    width = draw(st.integers(1, 32))
+    values = st.integers(0, (1 << width) - 1)
+    return width, draw(values), draw(values), draw(values), \
+        draw(st.lists(values, max_size=32))
+
+
+@st.composite
+def crc8_calculators(draw, allow_none=True):
+    if allow_none and draw(st.booleans()):
+        return None
+    return CrcCalculator(8, *draw(crc8_params))
+
+
+def build_frame(crc, rx_words):
+    frame = bytearray()
+    for word in rx_words:
+        raw = bytearray(pack(">H", word))
+        frame.extend(raw)
+        if crc is not None:
+            frame.append(crc(raw))
+    return bytes(frame)
+
+
+@given(crc_params())
+def test_crc_calculator(params):
+    width, polynomial, init_value, final_xor, data = params
+    crc = CrcCalculator(width, polynomial, init_value, final_xor)
+    assert crc(data) == reference_crc(*params)
+    assert crc(bytearray(d & 0xFF for d in data)) == reference_crc(
+        width, polynomial, init_value, final_xor,
+        bytearray(d & 0xFF for d in data))
+
+
+@given(st.data(), st.sampled_from([1, 2]), st.one_of(st.none(), words),
+       crc8_calculators())
+def test_build_tx_data(data, command_bytes, tx_words, crc):
+    command = data.draw(st.one_of(
+        st.none(), st.integers(0, (1 << (8 * command_bytes)) - 1)))
+    expected = reference_build_tx_data(command, command_bytes, tx_words, crc)
+    assert SensirionWordI2cCommand._build_tx_data(
+        command, command_bytes, tx_words, crc) == expected
+    cmd = SensirionWordI2cCommand(command, tx_words, None, 0, 0, crc,
+                                  command_bytes)
+    assert cmd.tx_data == (bytes(expected) if expected is not None else None)
+
+
+@given(st.binary(max_size=40), crc8_calculators())
+def test_interpret_random_response(data, crc):
+    cmd = SensirionWordI2cCommand(None, None, len(data), 0, 0, crc)
+    assert outcome(cmd.interpret_response, data) == \
+        outcome(reference_interpret_response, crc, data)
+
+
+@given(words, crc8_calculators(allow_none=False), st.data())
+def test_interpret_corrupted_response(rx_words, crc, data):
+    frame = bytearray(build_frame(crc, rx_words))
+    for _ in range(data.draw(st.integers(0, 3))):
+        if not frame:
+            break
+        index = data.draw(st.integers(0, len(frame) - 1))
+        frame[index] ^= 1 << data.draw(st.integers(0, 7))
+    frame = bytes(frame[:data.draw(st.integers(0, len(frame)))])
+    cmd = SensirionWordI2cCommand(None, None, len(frame), 0, 0, crc)
+    assert outcome(cmd.interpret_response, frame) == \
+        outcome(reference_interpret_response, crc, frame)
+
+
+SFM3019_CRC = CrcCalculator(8, 0x31, 0xFF)
+
+
+@given(st.lists(st.integers(0, 0xFFFF), min_size=2, max_size=2))
+def test_sfm3019_read_measurement(rx_words):
+    frame = build_frame(SFM3019_CRC, rx_words)
+    expected = reference_interpret_response(SFM3019_CRC, frame)
+    assert Sfm3019I2cCmdReadMeas().interpret_response(frame) == \
+        (int16(expected[0]), int16(expected[1]))
+
+
+@given(st.lists(st.integers(0, 0xFFFF), min_size=3, max_size=3))
+def test_sfm3019_get_unit_and_factors(rx_words):
+    frame = build_frame(SFM3019_CRC, rx_words)
+    result = Sfm3019I2cCmdGetUnitAndFactors(0x3608).interpret_response(frame)
+    assert result == (float(int16(rx_words[0])), float(int16(rx_words[1])),
+                      int16(rx_words[2]))
+
+
+@given(st.lists(st.integers(0, 0xFFFF), min_size=6, max_size=6))
+def test_sfm3019_product_identifier(rx_words):
+    frame = build_frame(SFM3019_CRC, rx_words)
+    cmd = Sfm3019I2cCmdReadProductIdentifierAndSerialNumber()
+    assert cmd.interpret_response(frame) == (
+        rx_words[0] << 16 | rx_words[1],
+        rx_words[2] << 48 | rx_words[3] << 32 | rx_words[4] << 16 |
+        rx_words[5])
+
+
+@given(st.binary(min_size=6, max_size=6))
+def test_sfm3019_read_measurement_random_frame(frame):
+    expected = outcome(reference_interpret_response, SFM3019_CRC, frame)
+    if expected[0] == "result":
+        expected = "result", (int16(expected[1][0]), int16(expected[1][1]))
+    assert outcome(Sfm3019I2cCmdReadMeas().interpret_response, frame) == \
+        expected